@@ -1,13 +1,14 @@
 # app.py
 # Versi: UI & struktur mirip "before" (dashboard pro, menu, approve table, dsb.)
-# Backend: Supabase (tanpa file JSON/Sheets)
+# Backend: Supabase (tanpa file JSON/Sheets) atau SQLite lokal — lihat storage.py
 import os
-import base64
-from io import BytesIO
+import time
+_run_start = time.perf_counter()
+import uuid
+from dataclasses import replace
 from datetime import datetime
-import pandas as pd
 import streamlit as st
-st.cache_data.clear()
+from startup import timings
 
 # --- Hotfix: alias agar kode lama tetap jalan di Streamlit baru ---
 try:
@@ -16,15 +17,9 @@ try:
 except Exception:
     pass
 
-
-# Optional grafik (Altair) — sama seperti referensi
-try:
-    import altair as alt
-    _ALT_OK = True
-except Exception:
-    _ALT_OK = False
-
-from supabase import create_client, Client
+# Halaman login hanya butuh streamlit + storage (tanpa pandas/altair/xlsxwriter/supabase);
+# modul data di-import setelah login, lihat "MODUL DATA" di bawah.
+from storage import backend_from_config, USERS_TABLE
 
 # ================== KONFIGURASI & STYLING ==================
 st.set_page_config(page_title="Inventory System", page_icon="🧰", layout="wide")
@@ -69,18 +64,86 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# ================== SUPABASE ==================
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# ================== STORAGE BACKEND ==================
+def _config(key, default=None):
+    # st.secrets dulu, lalu environment variable
+    try:
+        return st.secrets[key]
+    except Exception:
+        return os.environ.get(key, default)
+
+# STORAGE_BACKEND = "supabase" (default) | "sqlite"; satu instance (client + koneksi) per proses,
+# dibuat saat pertama dipakai (open_backend)
+@st.cache_data(ttl=600)
+def load_users():
+    data = backend_from_config(_config).select(USERS_TABLE)
+    return {r["username"]: {"password": r["password"], "role": r["role"]} for r in data}
 
 # (Opsional) multi-brand seperti "before": set True & tambahkan kolom brand di semua tabel
 ENABLE_BRAND = False
 BRANDS = ["gulavit", "takokak"]
 
+# ================== SESSION STATE ==================
+if "logged_in" not in st.session_state:
+    st.session_state.logged_in = False
+    st.session_state.username = ""
+    st.session_state.role = ""
+    st.session_state.current_brand = BRANDS[0]
+
+if "req_in_items" not in st.session_state: st.session_state.req_in_items = []
+if "req_out_items" not in st.session_state: st.session_state.req_out_items = []
+if "req_ret_items" not in st.session_state: st.session_state.req_ret_items = []
+if "notification" not in st.session_state: st.session_state.notification = None
+
+# ================== LOGIN PAGE (mirip before) ==================
+if not st.session_state.logged_in:
+    st.image(BANNER_URL, use_container_width=True)
+    st.markdown("<div style='text-align:center;'><h1 style='margin-top:10px;'>Inventory Management System</h1></div>", unsafe_allow_html=True)
+    st.subheader("Silakan Login untuk Mengakses Sistem")
+    username = st.text_input("Username", placeholder="Masukkan username")
+    password = st.text_input("Password", type="password", placeholder="Masukkan password")
+    if st.button("Login"):
+        users = load_users()
+        user = users.get(username)
+        if user and user["password"] == password:
+            st.session_state.logged_in = True
+            st.session_state.username = username
+            st.session_state.role = user["role"]
+            st.success(f"Login berhasil sebagai {user['role'].upper()}")
+            _safe_rerun()
+        else:
+            st.error("❌ Username atau password salah.")
+    timings.record("login", _run_start)
+    st.stop()
+
+# ================== MODUL DATA (dimuat setelah login) ==================
+_import_start = time.perf_counter()
+from io import BytesIO
+import pandas as pd
+from storage import InsufficientStock, INVENTORY_TABLE, PENDING_TABLE, HISTORY_TABLE, MONTHLY_TABLE
+from datacache import versions as data_versions
+from snapshot import shared_snapshots
+from journal import history_journal
+from approvals import approve_requests
+from stock_card import build_stock_card, STOCK_CARD_COLS, STOCK_CARD_HIST_COLS
+from exports import EXPORT_FORMATS, EXPORT_MIME, frame_chunks, export_reader, workbook_reader
+from reports import fetch_period_history, build_period_close
+from frames import INVENTORY_SCHEMA, compact_frame, footprint_report
+from search import inventory_index
+from master_import import MASTER_COLUMNS, validate_master_sheet, import_master
+from attachments import (attachment_store, referenced_attachments, attachment_ref, attachment_mime, attachment_reader,
+                         AttachmentTooLarge)
+from history import (history_loader, reset_history_loaders, HistoryQuery, fetch_history, HISTORY_ACTIONS,
+                     HISTORY_SORTS, HISTORY_PAGE_SIZES, fetch_history_page, count_history, iter_history_pages,
+                     prepare_history_df, MONTHLY_COLS, split_month_range, fetch_monthly, monthly_from_prepared)
+timings.record("import", _import_start)
+
+db = backend_from_config(_config)
+# Riwayat ADD_ITEM / REJECT_* / import master: ditulis ke jurnal lokal, dikirim ke db oleh thread latar belakang
+journal = history_journal(db, _config("HISTORY_JOURNAL_PATH"))
+
 # ================== UTILITAS & NORMALISASI ==================
-UPLOADS_DIR = "uploads"
-os.makedirs(UPLOADS_DIR, exist_ok=True)
+attachments = attachment_store()
 
 TRANS_TYPES = ["Support", "Penjualan"]
 STD_REQ_COLS = ["date","code","item","qty","unit","event","trans_type","do_number","attachment","user","timestamp"]
@@ -139,98 +202,230 @@ def normalize_return_record(base: dict) -> dict:
     })
     return rec
 
-def dataframe_to_excel_bytes(df: pd.DataFrame, sheet_name="Sheet1") -> bytes:
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
-    return output.read()
+# ================== STORAGE: LOAD/SAVE WRAPPERS ==================
+def _brand_filter(brand):
+    return [("brand", "eq", brand)] if ENABLE_BRAND and brand else []
 
-# ================== SUPABASE: LOAD/SAVE WRAPPERS ==================
-@st.cache_data(ttl=600)
-def load_users():
-    q = supabase.from_("users_gulavit").select("*")
-    data = q.execute().data or []
-    return {r["username"]: {"password": r["password"], "role": r["role"]} for r in data}
-
-@st.cache_data(ttl=300)
-def load_inventory(brand=None) -> pd.DataFrame:
-    q = supabase.from_("inventory_gulavit").select("*")
-    if ENABLE_BRAND and brand:
-        q = q.eq("brand", brand)
-    data = q.execute().data or []
+# Frame utama (inventory, pending, riwayat) = snapshot bersama per proses (snapshot.py): semua sesi
+# memegang referensi frame yang sama, dicap versi tabel. Writer hanya menaikkan versi tabel yang
+# ditulisnya, jadi tabel lain tetap dari snapshot sampai TTL habis.
+def _read_inventory(brand) -> pd.DataFrame:
+    # Urutan tetap (kode): Postgres tidak menjamin urutan baris tanpa ORDER BY
+    data = db.select(INVENTORY_TABLE, filters=_brand_filter(brand), order=[("code", False)])
     df = pd.DataFrame(data)
     if not df.empty:
+        # Tabel bisa punya 'qty' dan 'balance' sekaligus (stok ditulis ke keduanya)
+        if "qty" in df.columns: df.drop(columns=["balance"], inplace=True, errors="ignore")
         df.rename(columns={"item":"name","balance":"qty"}, inplace=True, errors="ignore")
         for c in ["code","name","unit","category"]:
             if c not in df.columns: df[c] = "-"
         if "qty" not in df.columns: df["qty"] = 0
         df["qty"] = pd.to_numeric(df["qty"], errors="coerce").fillna(0).astype(int)
+        # reserved = total pending OUT (dijaga storage saat submit/reject/approve) -> tersedia O(1) per barang
+        if "reserved" not in df.columns: df["reserved"] = 0
+        df["reserved"] = pd.to_numeric(df["reserved"], errors="coerce").fillna(0).astype(int)
+        df["available"] = (df["qty"] - df["reserved"]).clip(lower=0)
+        compact_frame(df, INVENTORY_SCHEMA)
     return df
 
-@st.cache_data(ttl=120)
+def _read_pending(brand) -> pd.DataFrame:
+    return pd.DataFrame(db.select(PENDING_TABLE, filters=_brand_filter(brand)))
+
+def _read_history(brand) -> pd.DataFrame:
+    # Bertahap: hanya baris setelah watermark id yang diambil, per halaman
+    return history_loader(db, _brand_filter(brand), columns=STOCK_CARD_HIST_COLS).sync().copy(deep=False)
+
+snapshots = shared_snapshots(db)
+snapshots.register("inventory", INVENTORY_TABLE, _read_inventory, ttl=300)
+snapshots.register("pending", PENDING_TABLE, _read_pending, ttl=120)
+snapshots.register("history", HISTORY_TABLE, _read_history, ttl=120)
+
+@st.cache_data(ttl=120, max_entries=32)
+def _query_history_cached(brand, query, version) -> pd.DataFrame:
+    df = fetch_history(db, query, base_filters=_brand_filter(brand))
+    df.attrs["version"] = version
+    return df
+
+@st.cache_data(ttl=120, max_entries=64)
+def _history_page_cached(brand, query, sort, after, page_size, version):
+    df, cursor = fetch_history_page(db, query, base_filters=_brand_filter(brand), sort=sort, after=after,
+                                    page_size=page_size)
+    df.attrs["version"] = version
+    return df, cursor
+
+@st.cache_data(ttl=120, max_entries=32)
+def _history_count_cached(brand, query, version) -> int:
+    return count_history(db, query, base_filters=_brand_filter(brand))
+
+# Periode yang sudah lewat (end_date < hari ini) di-cache tanpa versi riwayat: permintaan ulang
+# untuk periode tertutup tidak menarik riwayat lagi. Tombol "Hitung Ulang" membersihkan cache ini.
+@st.cache_data(ttl=None, max_entries=24)
+def _period_close_cached(brand, start_date, end_date, version) -> dict:
+    df_raw = fetch_period_history(db, end_date, base_filters=_brand_filter(brand))
+    return build_period_close(df_raw, load_inventory(brand), start_date, end_date, trans_types=TRANS_TYPES)
+
+def load_period_close(start_date, end_date, brand=None) -> dict:
+    closed = end_date < pd.Timestamp.today().date()
+    return _period_close_cached(brand, start_date, end_date, 0 if closed else data_versions.get(HISTORY_TABLE))
+
+def load_inventory(brand=None) -> pd.DataFrame:
+    return snapshots.get("inventory", brand)
+
 def load_pending(brand=None) -> pd.DataFrame:
-    q = supabase.from_("pending_gulavit").select("*")
-    if ENABLE_BRAND and brand:
-        q = q.eq("brand", brand)
-    data = q.execute().data or []
-    return pd.DataFrame(data)
+    return snapshots.get("pending", brand)
 
-@st.cache_data(ttl=120)
 def load_history(brand=None) -> pd.DataFrame:
-    q = supabase.from_("history_gulavit").select("*")
-    if ENABLE_BRAND and brand:
-        q = q.eq("brand", brand)
-    data = q.execute().data or []
-    return pd.DataFrame(data)
+    return snapshots.get("history", brand)
 
-def inv_add_item(code, name, qty, unit="-", category="Uncategorized", brand=None):
-    payload = {"code": code, "item": name, "qty": int(qty), "unit": unit or "-", "category": category or "Uncategorized"}
-    if ENABLE_BRAND: payload["brand"] = brand or BRANDS[0]
-    supabase.from_("inventory_gulavit").insert(payload).execute()
-    st.cache_data.clear()
+def query_history(query: HistoryQuery, brand=None) -> pd.DataFrame:
+    # Filter tanggal/aksi/user/barang + daftar kolom dikirim ke store (gte/lte/in/select)
+    return _query_history_cached(brand, query, data_versions.get(HISTORY_TABLE))
 
-def inv_update_qty(code, new_qty):
-    # Jika kolom di Supabase masih 'balance', update keduanya untuk aman
-    supabase.from_("inventory_gulavit").update({"qty": int(new_qty), "balance": int(new_qty)}).eq("code", code).execute()
-    st.cache_data.clear()
+def history_first_date(brand=None):
+    # Tanggal riwayat paling awal (satu baris), timestamp NULL dilewati
+    rows = db.select(HISTORY_TABLE, columns="timestamp", filters=_brand_filter(brand) + [("timestamp", "not.is", None)],
+                     order=[("timestamp", False)], limit=1)
+    ts = pd.to_datetime(rows[0]["timestamp"], errors="coerce") if rows else pd.NaT
+    return ts.date() if pd.notna(ts) else None
 
-def pending_insert(rec_type, rec, brand=None):
-    payload = {"type": rec_type, **rec}
+def inv_add_item(code, name, qty, unit="-", category="Uncategorized", brand=None):
+    payload = {"code": code, "item": name, "qty": int(qty), "unit": unit or "-", "category": category or "Uncategorized"}
     if ENABLE_BRAND: payload["brand"] = brand or BRANDS[0]
-    supabase.from_("pending_gulavit").insert(payload).execute()
-    st.cache_data.clear()
-
-def pending_delete_by_id(row_id):
-    supabase.from_("pending_gulavit").delete().eq("id", row_id).execute()
-    st.cache_data.clear()
+    db.insert(INVENTORY_TABLE, payload)
+    data_versions.bump(INVENTORY_TABLE)
+
+def new_batch_id():
+    return f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+def pending_submit_batch(rec_type, recs, brand=None) -> str:
+    # Satu insert multi-baris untuk seluruh keranjang; semua baris berbagi batch_id.
+    # OUT mencadangkan stok di transaksi yang sama (InsufficientStock -> tidak ada yang ditulis).
+    batch_id = new_batch_id()
+    rows = [{"type": rec_type, **rec, "batch_id": batch_id} for rec in recs]
+    if ENABLE_BRAND:
+        for row in rows: row["brand"] = brand or BRANDS[0]
+    db.submit_pending(rows)
+    data_versions.bump(PENDING_TABLE, INVENTORY_TABLE)
+    return batch_id
+
+def reject_pending_batch(rows, brand=None) -> int:
+    # rows: list of dict pending -> satu delete pending (id IN ..., reservasi OUT dilepas) + satu insert
+    # REJECT_* ke riwayat untuk baris yang benar-benar terhapus (yang sudah diproses admin lain dilewati)
+    ids = [int(r["id"]) for r in rows if pd.notna(r.get("id"))]
+    deleted = db.reject_pending(ids)
+    ts = timestamp()
+    entries = []
+    for req in deleted:
+        entry = {
+            "action": f"REJECT_{str(req.get('type','-')).upper()}",
+            "item": req.get("item","-"),
+            "qty": int(pd.to_numeric(req.get("qty",0), errors="coerce") or 0),
+            "stock": "-",
+            "unit": req.get("unit","-"),
+            "user": req.get("user","-"),
+            "event": req.get("event","-"),
+            "do_number": req.get("do_number","-"),
+            "attachment": req.get("attachment"),
+            "date": req.get("date"),
+            "code": req.get("code"),
+            "trans_type": req.get("trans_type"),
+            "batch_id": req.get("batch_id"),
+            "timestamp": ts,
+        }
+        if ENABLE_BRAND: entry["brand"] = brand or BRANDS[0]
+        entries.append(entry)
+    journal.append(HISTORY_TABLE, entries)   # versi riwayat naik saat jurnal terkirim
+    data_versions.bump(PENDING_TABLE, INVENTORY_TABLE)
+    return len(entries)
 
 def history_insert(entry, brand=None):
     payload = {**entry}
     if ENABLE_BRAND: payload["brand"] = brand or BRANDS[0]
-    supabase.from_("history_gulavit").insert(payload).execute()
-    st.cache_data.clear()
+    journal.append(HISTORY_TABLE, payload)
+
+def approve_pending_batch(rows, brand=None) -> dict:
+    # rows: list of dict pending; satu transaksi untuk semua baris (lihat approvals.py)
+    result = approve_requests(db, rows, timestamp(), brand=(brand or BRANDS[0]) if ENABLE_BRAND else None)
+    if result["approved"]:
+        data_versions.bump(INVENTORY_TABLE, PENDING_TABLE, HISTORY_TABLE)
+    elif result["failed"]:
+        data_versions.bump(PENDING_TABLE)
+    return result
+
+def _approval_notice(result) -> dict:
+    approved, failed = len(result["approved"]), result["failed"]
+    if failed:
+        detail = "\n- ".join(f"{f['code'] or '-'}: {f['reason']}" for f in failed)
+        return {"type":"warning","message": f"{approved} request di-approve, {len(failed)} gagal:\n- {detail}"}
+    return {"type":"success","message": f"{approved} request di-approve."}
+
+def reset_transactions(brand=None):
+    # Kosongkan pending & riwayat (inventori tidak disentuh)
+    flt = [("brand", "eq", brand)] if ENABLE_BRAND else [("id", "neq", -1)]
+    # Riwayat yang masih antre / dead letter dibuang dulu: kalau terkirim sesudah reset, transaksi muncul lagi
+    journal.discard(HISTORY_TABLE, brand if ENABLE_BRAND else None)
+    db.delete(PENDING_TABLE, flt)
+    db.rebuild_reservations()
+    db.delete(HISTORY_TABLE, flt)
+    db.delete(MONTHLY_TABLE, [("brand", "eq", brand)] if ENABLE_BRAND else [("type_norm", "neq", "")])
+    reset_history_loaders()
+    data_versions.bump(PENDING_TABLE, HISTORY_TABLE, INVENTORY_TABLE)
+    _period_close_cached.clear()   # periode tertutup tidak lagi valid
+    attachments.gc(referenced_attachments(db))
+
+# ================== TABEL RIWAYAT BERHALAMAN ==================
+HISTORY_SHOW_COLS = ["action","date","code","item","qty","unit","stock","trans_type","user","event","do_number","timestamp"]
+
+def _history_page_nav(state_key, step, cursor=None):
+    cursors = st.session_state[state_key]
+    if step > 0:
+        cursors.append(cursor)
+    elif len(cursors) > 1:
+        cursors.pop()
+
+def render_history_table(query: HistoryQuery, brand=None, key="hist", extra_cols=()) -> pd.DataFrame:
+    # Hanya satu halaman yang diambil & dikirim ke browser; total dari count query.
+    # session_state[key_cursors] = tumpukan cursor (halaman 1 = None) untuk tombol sebelumnya/berikutnya.
+    c1, c2 = st.columns([3, 1])
+    sort_label = c1.selectbox("Urutkan", list(HISTORY_SORTS), key=f"{key}_sort")
+    page_size = c2.selectbox("Baris per halaman", HISTORY_PAGE_SIZES, index=1, key=f"{key}_size")
+    sort = HISTORY_SORTS[sort_label]
+    query = replace(query, columns=tuple(HISTORY_SHOW_COLS) + tuple(extra_cols))
+
+    state_key = f"{key}_cursors"
+    sig = (brand, query, sort, page_size)
+    if st.session_state.get(f"{key}_sig") != sig:   # filter/urutan berubah -> kembali ke halaman 1
+        st.session_state[f"{key}_sig"] = sig
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    version = data_versions.get(HISTORY_TABLE)
+    total = _history_count_cached(brand, query, version)
+    df_page, next_cursor = _history_page_cached(brand, query, sort, cursors[-1], page_size, version)
+    for c in HISTORY_SHOW_COLS + list(extra_cols):
+        if c not in df_page.columns: df_page[c] = None
+    view = df_page[HISTORY_SHOW_COLS].copy()
+    if "attachment" in extra_cols:
+        # Hanya nama file yang dikirim; isi PDF dibaca saat tombol unduh diklik
+        view["Lampiran"] = df_page["attachment"].map(attachment_ref).fillna("Tidak Ada")
+    st.dataframe(view, use_container_width=True, hide_index=True)
+
+    nav1, nav2, nav3 = st.columns([1, 2, 1])
+    nav1.button("◀ Sebelumnya", key=f"{key}_prev", disabled=len(cursors) == 1,
+                on_click=_history_page_nav, args=(state_key, -1))
+    nav2.caption(f"Halaman {len(cursors)} dari {max(1, -(-total // page_size))} · {total} baris")
+    nav3.button("Berikutnya ▶", key=f"{key}_next", disabled=next_cursor is None,
+                on_click=_history_page_nav, args=(state_key, 1, next_cursor))
+    return df_page
 
 # ================== DASHBOARD HELPERS (mirip before) ==================
-def _prepare_history_df(df_hist_raw: pd.DataFrame) -> pd.DataFrame:
-    df = df_hist_raw.copy()
-    if df.empty: return df
-    for c in ["qty","date","timestamp","action","item","event","trans_type","unit"]:
-        if c not in df.columns: df[c] = None
-    df["qty"] = pd.to_numeric(df["qty"], errors="coerce").fillna(0).astype(int)
-    s_date = pd.to_datetime(df["date"], errors="coerce")
-    s_ts = pd.to_datetime(df["timestamp"], errors="coerce")
-    df["date_eff"] = s_date.fillna(s_ts).dt.floor("D")
-    act = df.get("action","").astype(str).str.upper()
-    df["type_norm"] = "-"
-    df.loc[act.str.contains("APPROVE_IN"), "type_norm"] = "IN"
-    df.loc[act.str.contains("APPROVE_OUT"), "type_norm"] = "OUT"
-    df.loc[act.str.contains("APPROVE_RETURN"), "type_norm"] = "RETURN"
-    df["event"] = df["event"].fillna("-").astype(str)
-    df["trans_type"] = df["trans_type"].fillna("-").astype(str)
-    df = df[df["type_norm"].isin(["IN","OUT","RETURN"])].copy()
-    df = df.dropna(subset=["date_eff"])
-    return df
+# Optional grafik (Altair) — di-import saat dashboard pertama dirender, bukan saat startup
+def _altair():
+    try:
+        import altair as alt
+        return alt
+    except Exception:
+        return None
 
 def _kpi_card(title, value, change_text=None):
     st.markdown(f"""
@@ -241,8 +436,27 @@ def _kpi_card(title, value, change_text=None):
         </div>
     """, unsafe_allow_html=True)
 
-def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_label: str, allow_download=True):
-    df_hist = _prepare_history_df(df_hist_raw)
+DASHBOARD_HIST_COLS = ("date","timestamp","action","qty","item","code","event","trans_type","unit")
+
+@st.cache_data(ttl=300, max_entries=32)
+def _monthly_cached(brand, month_start, month_end_excl, version) -> pd.DataFrame:
+    return fetch_monthly(db, month_start, month_end_excl, base_filters=_brand_filter(brand))
+
+def load_dashboard_monthly(start_date, end_date, brand=None) -> pd.DataFrame:
+    # Bulan penuh dari tabel agregat; hari sisa di tepi periode dari riwayat mentah (sedikit baris)
+    full, edges = split_month_range(start_date, end_date)
+    parts = []
+    if full:
+        parts.append(_monthly_cached(brand, full[0], full[1], data_versions.get(HISTORY_TABLE)))
+    for a, b in edges:
+        raw = query_history(HistoryQuery(start_date=a, end_date=b, action_prefixes=("APPROVE_",),
+                                         columns=DASHBOARD_HIST_COLS), brand=brand)
+        parts.append(monthly_from_prepared(prepare_history_df(raw)))
+    parts = [p for p in parts if not p.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=MONTHLY_COLS)
+
+def render_dashboard_pro(df_inv: pd.DataFrame, brand_label: str, brand=None, allow_download=True):
+    alt = _altair()
     st.markdown(f"## Dashboard — {brand_label}")
     st.caption("Semua metrik berbasis jumlah (qty). *Sales* = OUT dengan tipe **Penjualan**.")
     st.divider()
@@ -254,12 +468,8 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
     start_date = colF1.date_input("Tanggal mulai", value=default_start.date())
     end_date   = colF2.date_input("Tanggal akhir", value=today.date())
 
-    # Range
-    if not df_hist.empty:
-        mask = (df_hist["date_eff"] >= pd.Timestamp(start_date)) & (df_hist["date_eff"] <= pd.Timestamp(end_date))
-        df_range = df_hist.loc[mask].copy()
-    else:
-        df_range = pd.DataFrame(columns=["date_eff","type_norm","qty","item","event","trans_type"])
+    # Range: (month, type_norm, event, trans_type, code) -> qty
+    df_range = load_dashboard_monthly(start_date, end_date, brand=brand)
 
     # KPI
     df_inv_view = pd.DataFrame([{"Kode": r["code"], "Nama Barang": r["name"], "Current Stock": int(r["qty"]), "Unit": r.get("unit","-")}
@@ -280,10 +490,9 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
 
     # Agregasi bulanan
     def month_agg(df, tipe):
-        d = df[df["type_norm"]==tipe].copy()
+        d = df[df["type_norm"]==tipe]
         if d.empty:
             return pd.DataFrame({"month": [], "qty": [], "Periode": [], "idx": []})
-        d["month"] = d["date_eff"].dt.to_period("M").dt.to_timestamp()
         g = d.groupby("month", as_index=False)["qty"].sum().sort_values("month")
         g["Periode"] = g["month"].dt.strftime("%b %Y")
         g["idx"] = g["month"].dt.year.astype(int) * 12 + g["month"].dt.month.astype(int)
@@ -297,7 +506,7 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
     def _month_bar(container, dfm, title, color="#0EA5E9"):
         with container:
             st.markdown(f'<div class="card"><div class="smallcap">{title}</div>', unsafe_allow_html=True)
-            if _ALT_OK and not dfm.empty:
+            if alt is not None and not dfm.empty:
                 chart = (
                     alt.Chart(dfm)
                     .mark_bar(size=28)
@@ -328,7 +537,7 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
         st.markdown('<div class="card"><div class="smallcap">Top 10 Items (Current Stock)</div>', unsafe_allow_html=True)
         if not df_inv_view.empty:
             top10 = df_inv_view.sort_values("Current Stock", ascending=False).head(10)
-            if _ALT_OK:
+            if alt is not None:
                 chart = (
                     alt.Chart(top10)
                     .mark_bar(size=22)
@@ -352,7 +561,7 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
         df_ev = df_ev[df_ev["event"].astype(str).str.strip().ne("-")]
         ev_top = (df_ev.groupby("event", as_index=False)["qty"].sum()
                   .sort_values("qty", ascending=False).head(5))
-        if _ALT_OK and not ev_top.empty:
+        if alt is not None and not ev_top.empty:
             chart = (
                 alt.Chart(ev_top)
                 .mark_bar(size=22)
@@ -369,37 +578,89 @@ def render_dashboard_pro(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, brand_
                                use_container_width=True, hide_index=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
-# ================== SESSION STATE ==================
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
-    st.session_state.username = ""
-    st.session_state.role = ""
-    st.session_state.current_brand = BRANDS[0]
-
-if "req_in_items" not in st.session_state: st.session_state.req_in_items = []
-if "req_out_items" not in st.session_state: st.session_state.req_out_items = []
-if "req_ret_items" not in st.session_state: st.session_state.req_ret_items = []
-if "notification" not in st.session_state: st.session_state.notification = None
-
-# ================== LOGIN PAGE (mirip before) ==================
-if not st.session_state.logged_in:
-    st.image(BANNER_URL, use_container_width=True)
-    st.markdown("<div style='text-align:center;'><h1 style='margin-top:10px;'>Inventory Management System</h1></div>", unsafe_allow_html=True)
-    st.subheader("Silakan Login untuk Mengakses Sistem")
-    username = st.text_input("Username", placeholder="Masukkan username")
-    password = st.text_input("Password", type="password", placeholder="Masukkan password")
-    if st.button("Login"):
-        users = load_users()
-        user = users.get(username)
-        if user and user["password"] == password:
-            st.session_state.logged_in = True
-            st.session_state.username = username
-            st.session_state.role = user["role"]
-            st.success(f"Login berhasil sebagai {user['role'].upper()}")
-            _safe_rerun()
+# ================== PENCARIAN BARANG ==================
+PICKER_LIMIT = 50
+
+def filter_inventory_view(df_inv: pd.DataFrame, df_view: pd.DataFrame, search_query, brand=None) -> pd.DataFrame:
+    # df_view = df_inv yang di-rename (baris & urutan sama) -> hasil terurut relevansi
+    return inventory_index(df_inv, key=brand).filter(df_view, search_query)
+
+def item_picker(container, df_inv: pd.DataFrame, label, key, format_row, brand=None) -> dict:
+    # Typeahead: ketik nama/kode/kategori -> selectbox hanya berisi PICKER_LIMIT hasil teratas
+    index = inventory_index(df_inv, key=brand)
+    query = container.text_input("Cari barang", key=f"{key}_q", placeholder="Ketik nama, kode, atau kategori")
+    positions = index.search(query, limit=PICKER_LIMIT).tolist()
+    if not positions:
+        container.caption("Tidak ada barang yang cocok, menampilkan semua.")
+        positions = index.search("", limit=PICKER_LIMIT).tolist()
+    rows = {p: df_inv.iloc[p].to_dict() for p in positions}
+    pos = container.selectbox(label, positions, key=f"{key}_sel", format_func=lambda p: format_row(rows[p]))
+    return rows[pos]
+
+# ================== STOCK CARD ==================
+def render_stock_card(df_hist: pd.DataFrame, df_inv: pd.DataFrame, brand=None):
+    st.markdown(f"## Stock Card Barang - Brand {st.session_state.current_brand.capitalize()}")
+    st.divider()
+    if df_hist.empty or df_inv.empty:
+        st.info("Belum ada riwayat transaksi atau master barang.")
+        return
+    # Dipilih per kode (nama bisa berubah); riwayat lama tanpa kode dipetakan lewat nama
+    inv_sorted = df_inv.sort_values("name")
+    names = dict(zip(inv_sorted["code"], inv_sorted["name"]))
+    name_to_code = dict(zip(df_inv["name"], df_inv["code"]))
+    c1, c2 = st.columns([2,1])
+    selected_code = c1.selectbox("Pilih Barang", list(names), format_func=lambda c: f"{names[c]} ({c})")
+    start_date = c2.date_input("Saldo awal per tanggal (opsional)", value=None)
+    if selected_code:
+        # Indeks per kode dibangun sekali per load riwayat -> ganti barang tanpa scan ulang df_hist
+        loader = history_loader(db, _brand_filter(brand), columns=STOCK_CARD_HIST_COLS)
+        positions = loader.index.lookup(selected_code, names=(names[selected_code],))
+        card = build_stock_card(df_hist, selected_code, name_to_code=name_to_code, start_date=start_date,
+                                positions=positions)
+        if card.empty:
+            st.info("Tidak ada riwayat transaksi yang disetujui untuk barang ini.")
         else:
-            st.error("❌ Username atau password salah.")
-    st.stop()
+            st.dataframe(card, use_container_width=True, hide_index=True)
+            st.download_button("Unduh Stock Card (Excel)",
+                               data=export_reader("xlsx", STOCK_CARD_COLS, lambda: frame_chunks(card), sheet_name="Stock Card"),
+                               file_name=f"Stock_Card_{selected_code}.xlsx", mime=EXPORT_MIME["xlsx"], on_click="ignore")
+
+# ================== DATA PER HALAMAN ==================
+# Dataset yang dibaca tiap menu. Loader (snapshot bersama) baru dipanggil saat halaman mengakses
+# datasetnya, jadi mis. "Request Retur" tidak pernah memuat riwayat/pending.
+PAGE_DATA = {
+    "Dashboard": ("inventory",),            # grafik dari agregat bulanan, bukan riwayat penuh
+    "Lihat Stok Barang": ("inventory",),
+    "Stock Card": ("inventory", "history"),  # riwayat: hanya kolom STOCK_CARD_HIST_COLS
+    "Tambah Master Barang": ("inventory",),
+    "Approve Request": ("pending",),
+    "Riwayat Lengkap": (),                    # query berhalaman langsung ke store
+    "Export Laporan ke Excel": ("inventory",),
+    "Reset Database": (),
+    "Request Barang IN": ("inventory",),
+    "Request Barang OUT": ("inventory",),
+    "Request Retur": ("inventory",),
+    "Lihat Riwayat": (),
+}
+DATA_LOADERS = {"inventory": load_inventory, "pending": load_pending, "history": load_history}
+
+class PageData:
+    # data.inventory / data.pending / data.history -> dimuat saat pertama diakses, sekali per run.
+    # Dataset yang tidak dideklarasikan di PAGE_DATA ditolak supaya peta tetap sesuai kode halaman.
+    def __init__(self, page, brand=None):
+        self.page = page
+        self.brand = brand
+        self.needs = PAGE_DATA.get(page, ())
+        self._frames = {}
+
+    def __getattr__(self, name):
+        if name not in DATA_LOADERS:
+            raise AttributeError(name)
+        if name not in self.needs:
+            raise KeyError(f"Menu '{self.page}' tidak mendeklarasikan data '{name}' di PAGE_DATA")
+        if name not in self._frames:
+            self._frames[name] = DATA_LOADERS[name](brand=self.brand)
+        return self._frames[name]
 
 # ================== MAIN APP ==================
 role = st.session_state.role
@@ -431,10 +692,22 @@ if st.session_state.notification:
     (st.success if nt["type"]=="success" else st.warning if nt["type"]=="warning" else st.error)(nt["message"])
     st.session_state.notification = None
 
-# Muat data dari Supabase (cached)
-df_inv = load_inventory(brand=brand)
-df_hist = load_history(brand=brand)
-df_pending = load_pending(brand=brand)
+# Diagnosis proses (admin): ukuran snapshot bersama (semua brand yang sudah dimuat) & waktu startup
+if role == "admin":
+    with st.sidebar.expander("💾 Memori Data"):
+        loaded = snapshots.loaded()
+        st.dataframe(footprint_report({f"{name} · {key or '-'} · v{ver}": frame
+                                       for (name, key), (ver, _, frame) in loaded.items()}),
+                     hide_index=True, use_container_width=True)
+    with st.sidebar.expander("⏱️ Startup"):
+        st.dataframe(pd.DataFrame(timings.report()), hide_index=True, use_container_width=True)
+    if hasattr(db, "http_stats"):
+        with st.sidebar.expander("📡 Supabase"):
+            st.caption("Latensi per percobaan (histogram), retry & error per tabel sejak proses dimulai.")
+            st.dataframe(pd.DataFrame(db.http_stats()), hide_index=True, use_container_width=True)
+    with st.sidebar.expander("📝 Jurnal Riwayat"):
+        st.caption("Riwayat yang belum terkirim ke database (dikirim ulang otomatis, juga setelah restart).")
+        st.dataframe(pd.DataFrame([journal.status()]), hide_index=True, use_container_width=True)
 
 # ================== MENU ADMIN ==================
 if role == "admin":
@@ -449,16 +722,17 @@ if role == "admin":
         "Reset Database"
     ]
     menu = st.sidebar.radio("📌 Menu Admin", admin_options)
+    data = PageData(menu, brand)
 
     # Dashboard
     if menu == "Dashboard":
-        render_dashboard_pro(df_hist, df_inv, brand_label=st.session_state.current_brand.capitalize(), allow_download=False)
+        render_dashboard_pro(data.inventory, brand_label=st.session_state.current_brand.capitalize(), brand=brand, allow_download=False)
 
     elif menu == "Lihat Stok Barang":
         st.markdown(f"## Stok Barang - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if not df_inv.empty:
-            df_inventory_full = df_inv.rename(columns={"name":"Nama Barang","qty":"Qty","code":"Kode","unit":"Satuan"})
+        if not data.inventory.empty:
+            df_inventory_full = data.inventory.rename(columns={"name":"Nama Barang","qty":"Qty","code":"Kode","unit":"Satuan"})
             if "category" not in df_inventory_full.columns: df_inventory_full["category"]="Uncategorized"
             df_inventory_full.rename(columns={"category":"Kategori"}, inplace=True)
 
@@ -466,66 +740,15 @@ if role == "admin":
             selected_category = st.selectbox("Pilih Kategori", unique_categories)
             search_query = st.text_input("Cari berdasarkan Nama atau Kode")
 
-            df_filtered = df_inventory_full.copy()
+            df_filtered = filter_inventory_view(data.inventory, df_inventory_full, search_query, brand=brand)
             if selected_category != "Semua Kategori":
                 df_filtered = df_filtered[df_filtered["Kategori"] == selected_category]
-            if search_query:
-                df_filtered = df_filtered[
-                    df_filtered["Nama Barang"].str.contains(search_query, case=False) |
-                    df_filtered["Kode"].str.contains(search_query, case=False)
-                ]
             st.dataframe(df_filtered, use_container_width=True, hide_index=True)
         else:
             st.info("Belum ada barang di inventory.")
 
     elif menu == "Stock Card":
-        st.markdown(f"## Stock Card Barang - Brand {st.session_state.current_brand.capitalize()}")
-        st.divider()
-        if df_hist.empty or df_inv.empty:
-            st.info("Belum ada riwayat transaksi atau master barang.")
-        else:
-            item_names = sorted(df_inv["name"].unique().tolist())
-            selected_item_name = st.selectbox("Pilih Barang", item_names)
-            if selected_item_name:
-                filtered_history = df_hist[df_hist["item"] == selected_item_name]
-                filtered_history = filtered_history[
-                    filtered_history["action"].astype(str).str.startswith(("APPROVE","ADD"))
-                ].copy()
-                if filtered_history.empty:
-                    st.info("Tidak ada riwayat transaksi yang disetujui untuk barang ini.")
-                else:
-                    stock_card_data = []
-                    current_balance = 0
-                    for _, h in filtered_history.sort_values("timestamp").iterrows():
-                        transaction_in = 0
-                        transaction_out = 0
-                        keterangan = "N/A"
-                        act = str(h["action"])
-                        if act == "ADD_ITEM":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = "Initial Stock"
-                        elif act == "APPROVE_IN":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = f"Request IN by {h['user']}"
-                            do_number = h.get('do_number', '-')
-                            if pd.notna(do_number) and do_number != '-': keterangan += f" (No. DO: {do_number})"
-                        elif act == "APPROVE_OUT":
-                            transaction_out = h["qty"]; current_balance -= transaction_out
-                            tipe = h.get("trans_type","-")
-                            keterangan = f"Request OUT ({tipe}) by {h['user']} for event: {h.get('event', '-')}"
-                        elif act == "APPROVE_RETURN":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = f"Retur by {h['user']} for event: {h.get('event', '-')}"
-                        else:
-                            continue
-                        stock_card_data.append({
-                            "Tanggal": h.get("date", h["timestamp"]),
-                            "Keterangan": keterangan,
-                            "Masuk (IN)": transaction_in if transaction_in > 0 else "-",
-                            "Keluar (OUT)": transaction_out if transaction_out > 0 else "-",
-                            "Saldo Akhir": current_balance
-                        })
-                    st.dataframe(pd.DataFrame(stock_card_data), use_container_width=True, hide_index=True)
+        render_stock_card(data.history, data.inventory, brand=brand)
 
     elif menu == "Tambah Master Barang":
         st.markdown(f"## Tambah Master Barang - Brand {st.session_state.current_brand.capitalize()}")
@@ -541,14 +764,14 @@ if role == "admin":
             if st.button("Tambah Barang Manual"):
                 if not code_input.strip():
                     st.error("Kode Barang wajib diisi.")
-                elif (not df_inv.empty) and (code_input in df_inv["code"].tolist()):
+                elif (not data.inventory.empty) and (code_input in data.inventory["code"].tolist()):
                     st.error(f"Kode Barang '{code_input}' sudah ada.")
                 elif not name.strip():
                     st.error("Nama barang wajib diisi.")
                 else:
                     inv_add_item(code_input, name.strip(), qty, unit.strip() or "-", category.strip() or "Uncategorized", brand=brand)
                     history_insert({
-                        "action":"ADD_ITEM","item":name.strip(),"qty":int(qty),"stock":int(qty),
+                        "action":"ADD_ITEM","code":code_input,"item":name.strip(),"qty":int(qty),"stock":int(qty),
                         "unit":unit.strip() or "-", "user":st.session_state.username,
                         "event":"-","timestamp":timestamp()
                     }, brand=brand)
@@ -577,31 +800,23 @@ if role == "admin":
             if fu and st.button("Tambah dari Excel (Master)"):
                 try:
                     df_new = pd.read_excel(fu, engine="openpyxl")
-                    required = ["Kode Barang","Nama Barang","Qty","Satuan","Kategori"]
-                    miss = [c for c in required if c not in df_new.columns]
+                    miss = [c for c in MASTER_COLUMNS if c not in df_new.columns]
                     if miss:
                         st.error(f"Kolom kurang: {', '.join(miss)}")
                     else:
-                        errors, added = [], 0
-                        existing_codes = set(df_inv["code"].tolist()) if not df_inv.empty else set()
-                        for i, row in df_new.iterrows():
-                            code = str(row["Kode Barang"]).strip() if pd.notna(row["Kode Barang"]) else ""
-                            name = str(row["Nama Barang"]).strip() if pd.notna(row["Nama Barang"]) else ""
-                            if not code or not name:
-                                errors.append(f"Baris {i+2}: Kode/Nama wajib."); continue
-                            if code in existing_codes:
-                                errors.append(f"Baris {i+2}: Kode '{code}' sudah ada."); continue
-                            qty  = int(pd.to_numeric(row["Qty"], errors="coerce") or 0)
-                            unit = str(row["Satuan"]).strip() if pd.notna(row["Satuan"]) else "-"
-                            cat  = str(row["Kategori"]).strip() if pd.notna(row["Kategori"]) else "Uncategorized"
-                            inv_add_item(code, name, qty, unit, cat, brand=brand)
-                            history_insert({
-                                "action":"ADD_ITEM","item":name,"qty":qty,"stock":qty,"unit":unit,
-                                "user":st.session_state.username,"event":"-","timestamp":timestamp()
-                            }, brand=brand)
-                            added += 1
-                        if added: st.success(f"{added} item master berhasil ditambahkan.")
-                        if errors: st.warning("Beberapa baris dilewati:\n- " + "\n- ".join(errors))
+                        existing_codes = data.inventory["code"].tolist() if not data.inventory.empty else []
+                        df_valid, errors = validate_master_sheet(df_new, existing_codes)
+                        added, save_errors = import_master(db, df_valid, st.session_state.username, timestamp(),
+                                                           brand=(brand or BRANDS[0]) if ENABLE_BRAND else None,
+                                                           history_sink=lambda rows: journal.append(HISTORY_TABLE, rows))
+                        if added:
+                            data_versions.bump(INVENTORY_TABLE)
+                        errors = pd.concat([errors, save_errors], ignore_index=True)
+                        msg = f"{added} item master berhasil ditambahkan."
+                        if len(errors):
+                            msg += " Beberapa baris dilewati:\n- " + "\n- ".join(
+                                f"Baris {b}: {a}" + (f" ('{k}')" if k else "") for b, k, a in errors.itertuples(index=False))
+                        st.session_state.notification = {"type": "warning" if len(errors) else "success", "message": msg}
                         _safe_rerun()
                 except Exception as e:
                     st.error(f"Gagal membaca Excel: {e}")
@@ -609,7 +824,7 @@ if role == "admin":
     elif menu == "Approve Request":
         st.markdown(f"## Approve / Reject Request Barang - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        df_p = df_pending.copy()
+        df_p = data.pending.copy()
         if df_p.empty:
             st.info("Tidak ada pending request.")
         else:
@@ -618,9 +833,32 @@ if role == "admin":
                 if k not in df_p.columns: df_p[k] = None
             df_p["Lampiran"] = df_p["attachment"].apply(lambda x: "Ada" if x else "Tidak Ada")
 
-            # Checkbox column seperti before
-            if "approve_select_flags" not in st.session_state or len(st.session_state.approve_select_flags) != len(df_p):
+            # Satu pengajuan keranjang = satu batch; approve/reject seluruh baris batch sekaligus
+            if "batch_id" in df_p.columns and df_p["batch_id"].notna().any():
+                batches = (df_p.dropna(subset=["batch_id"])
+                           .groupby("batch_id", sort=False)
+                           .agg(type=("type","first"), user=("user","first"), n=("id","size"), ts=("timestamp","min"))
+                           .sort_values("ts"))
+                cb1, cb2, cb3 = st.columns([3,1,1])
+                sel_batch = cb1.selectbox(
+                    "Batch Pengajuan", list(batches.index),
+                    format_func=lambda b: f"{batches.at[b,'type']} · {batches.at[b,'user']} · {batches.at[b,'n']} item · {batches.at[b,'ts']}")
+                batch_rows = df_p[df_p["batch_id"] == sel_batch].drop(columns=["Lampiran"]).to_dict(orient="records")
+                if cb2.button("Approve Batch"):
+                    st.session_state.notification = _approval_notice(approve_pending_batch(batch_rows, brand=brand))
+                    _safe_rerun()
+                if cb3.button("Reject Batch"):
+                    rejected = reject_pending_batch(batch_rows, brand=brand)
+                    st.session_state.notification = {"type":"success","message": f"{rejected} request di-reject."}
+                    _safe_rerun()
+                st.divider()
+
+            # Checkbox column seperti before (reset juga bila pending berubah oleh sesi lain)
+            pending_version = data.pending.attrs.get("version")
+            if ("approve_select_flags" not in st.session_state or len(st.session_state.approve_select_flags) != len(df_p)
+                    or st.session_state.get("approve_select_version") != pending_version):
                 st.session_state.approve_select_flags = [False]*len(df_p)
+                st.session_state.approve_select_version = pending_version
 
             csel1, csel2 = st.columns([1,1])
             if csel1.button("Pilih semua"): st.session_state.approve_select_flags = [True]*len(df_p)
@@ -640,152 +878,139 @@ if role == "admin":
                 if selected_rows.empty:
                     st.session_state.notification = {"type":"warning","message":"Pilih setidaknya satu item untuk di-approve."}
                     _safe_rerun()
-                approved = 0
-                # muat inventori terbaru
-                cur_inv = load_inventory(brand=brand)
-                by_code = {r["code"]: r for _, r in cur_inv.iterrows()}
-                for _, req in selected_rows.iterrows():
-                    rtype = str(req["type"]).upper()  # IN/OUT/RETURN
-                    code  = req.get("code")
-                    qty   = int(pd.to_numeric(req.get("qty",0), errors="coerce") or 0)
-                    if code in by_code:
-                        item_row = by_code[code]
-                        new_stock = int(item_row["qty"])
-                        if rtype == "IN": new_stock += qty
-                        elif rtype == "OUT": new_stock -= qty
-                        elif rtype == "RETURN": new_stock += qty
-                        inv_update_qty(code, new_stock)
-                        history_insert({
-                            "action": f"APPROVE_{rtype}",
-                            "item": req.get("item","-"),
-                            "qty": qty,
-                            "stock": new_stock,
-                            "unit": req.get("unit","-"),
-                            "user": req.get("user","-"),
-                            "event": req.get("event","-"),
-                            "do_number": req.get("do_number","-"),
-                            "attachment": req.get("attachment"),
-                            "date": req.get("date"),
-                            "code": code,
-                            "trans_type": req.get("trans_type"),
-                            "timestamp": timestamp()
-                        }, brand=brand)
-                        if pd.notna(req.get("id")):
-                            pending_delete_by_id(req["id"])
-                        approved += 1
-                st.session_state.notification = {"type":"success","message": f"{approved} request di-approve."}
+                result = approve_pending_batch(selected_rows.drop(columns=["Pilih","Lampiran"]).to_dict(orient="records"), brand=brand)
+                st.session_state.notification = _approval_notice(result)
                 _safe_rerun()
 
             if col2.button("Reject Selected"):
                 if selected_rows.empty:
                     st.session_state.notification = {"type":"warning","message":"Pilih setidaknya satu item untuk di-reject."}
                     _safe_rerun()
-                rejected = 0
-                for _, req in selected_rows.iterrows():
-                    history_insert({
-                        "action": f"REJECT_{str(req.get('type','-')).upper()}",
-                        "item": req.get("item","-"),
-                        "qty": int(pd.to_numeric(req.get("qty",0), errors="coerce") or 0),
-                        "stock": "-",
-                        "unit": req.get("unit","-"),
-                        "user": req.get("user","-"),
-                        "event": req.get("event","-"),
-                        "do_number": req.get("do_number","-"),
-                        "attachment": req.get("attachment"),
-                        "date": req.get("date"),
-                        "code": req.get("code"),
-                        "trans_type": req.get("trans_type"),
-                        "timestamp": timestamp()
-                    }, brand=brand)
-                    if pd.notna(req.get("id")):
-                        pending_delete_by_id(req["id"])
-                    rejected += 1
+                rejected = reject_pending_batch(selected_rows.drop(columns=["Pilih","Lampiran"]).to_dict(orient="records"), brand=brand)
                 st.session_state.notification = {"type":"success","message": f"{rejected} request di-reject."}
                 _safe_rerun()
 
     elif menu == "Riwayat Lengkap":
         st.markdown(f"## Riwayat Lengkap - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_hist.empty:
+        first_date = history_first_date(brand=brand)
+        if first_date is None:
             st.info("Belum ada riwayat.")
         else:
-            all_keys = ["action","item","qty","stock","unit","user","event","do_number","attachment","timestamp","date","code","trans_type"]
-            for k in all_keys:
-                if k not in df_hist.columns: df_hist[k] = None
-            df_hist['date_only'] = pd.to_datetime(df_hist['date'].fillna(df_hist['timestamp']), errors="coerce").dt.date
-
-            def get_download_link(path):
-                if path and isinstance(path,str) and os.path.exists(path):
-                    with open(path, "rb") as f:
-                        bytes_data = f.read()
-                    b64 = base64.b64encode(bytes_data).decode()
-                    return f'<a href="data:application/pdf;base64,{b64}" download="{os.path.basename(path)}">Unduh</a>'
-                return 'Tidak Ada'
-            df_hist['Lampiran'] = df_hist['attachment'].apply(get_download_link)
-
             col1, col2 = st.columns(2)
-            start_date = col1.date_input("Tanggal Mulai", value=df_hist['date_only'].min())
-            end_date = col2.date_input("Tanggal Akhir", value=df_hist['date_only'].max())
+            start_date = col1.date_input("Tanggal Mulai", value=first_date)
+            end_date = col2.date_input("Tanggal Akhir", value=max(first_date, pd.Timestamp.today().date()))
 
             col3, col4, col5 = st.columns(3)
-            users = ["Semua Pengguna"] + sorted(df_hist["user"].dropna().astype(str).unique())
+            users = ["Semua Pengguna"] + sorted(load_users().keys())
             selected_user = col3.selectbox("Filter Pengguna", users)
-            actions = ["Semua Tipe"] + sorted(df_hist["action"].dropna().astype(str).unique())
+            actions = ["Semua Tipe"] + HISTORY_ACTIONS
             selected_action = col4.selectbox("Filter Tipe Aksi", actions)
             search_item = col5.text_input("Cari Nama Barang")
 
-            df_filtered = df_hist.copy()
-            df_filtered = df_filtered[(df_filtered['date_only'] >= start_date) & (df_filtered['date_only'] <= end_date)]
-            if selected_user != "Semua Pengguna":
-                df_filtered = df_filtered[df_filtered["user"].astype(str) == selected_user]
-            if selected_action != "Semua Tipe":
-                df_filtered = df_filtered[df_filtered["action"].astype(str) == selected_action]
-            if search_item:
-                df_filtered = df_filtered[df_filtered["item"].astype(str).str.contains(search_item, case=False, na=False)]
+            # Semua filter dijalankan di store; hanya satu halaman hasil yang diunduh
+            query = HistoryQuery(
+                start_date=start_date, end_date=end_date,
+                users=(selected_user,) if selected_user != "Semua Pengguna" else (),
+                actions=(selected_action,) if selected_action != "Semua Tipe" else (),
+                item_search=search_item.strip(),
+            )
+            df_page = render_history_table(query, brand=brand, key="riwayat_admin", extra_cols=("attachment",))
 
-            show_cols = ["action","date","code","item","qty","unit","stock","trans_type","user","event","do_number","timestamp","Lampiran"]
-            show_cols = [c for c in show_cols if c in df_filtered.columns]
-            st.markdown(df_filtered[show_cols].to_html(escape=False, index=False), unsafe_allow_html=True)
+            refs = df_page["attachment"].map(attachment_ref).dropna().unique().tolist()
+            if refs:
+                col_a, col_b = st.columns([3, 1])
+                ref = col_a.selectbox("Lampiran", refs, format_func=attachments.original_name)
+                col_b.download_button("Unduh Lampiran", data=attachment_reader(ref),
+                                      file_name=attachments.original_name(ref),
+                                      mime=attachment_mime(ref), on_click="ignore")
 
     elif menu == "Export Laporan ke Excel":
         st.markdown(f"## Filter dan Unduh Laporan - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_inv.empty:
-            st.info("Tidak ada data untuk diexport.")
-        else:
-            df_inventory_full = df_inv.rename(columns={"name":"Nama Barang","qty":"Qty","code":"Kode","unit":"Satuan"})
-            if "category" not in df_inventory_full.columns: df_inventory_full["category"]="Uncategorized"
-            df_inventory_full.rename(columns={"category":"Kategori"}, inplace=True)
-
-            unique_categories = ["Semua Kategori"] + sorted(df_inventory_full["Kategori"].unique())
-            selected_category = st.selectbox("Pilih Kategori", unique_categories)
-            search_query = st.text_input("Cari berdasarkan Nama atau Kode")
-
-            df_filtered = df_inventory_full.copy()
-            if selected_category != "Semua Kategori":
-                df_filtered = df_filtered[df_filtered["Kategori"] == selected_category]
-            if search_query:
-                df_filtered = df_filtered[
-                    df_filtered["Nama Barang"].str.contains(search_query, case=False) |
-                    df_filtered["Kode"].str.contains(search_query, case=False)
-                ]
-
-            st.markdown("### Preview Laporan")
-            st.dataframe(df_filtered, use_container_width=True, hide_index=True)
+        # File dibuat per chunk saat tombol unduh diklik (tidak di-cache per kombinasi filter)
+        fmt = EXPORT_FORMATS[st.radio("Format File", list(EXPORT_FORMATS), horizontal=True)]
+        brand_cap = st.session_state.current_brand.capitalize()
+        tab_inv, tab_hist, tab_close = st.tabs(["Stok Barang", "Riwayat Transaksi", "Tutup Periode"])
+
+        with tab_inv:
+            if data.inventory.empty:
+                st.info("Tidak ada data untuk diexport.")
+            else:
+                df_inventory_full = data.inventory.rename(columns={"name":"Nama Barang","qty":"Qty","code":"Kode","unit":"Satuan"})
+                if "category" not in df_inventory_full.columns: df_inventory_full["category"]="Uncategorized"
+                df_inventory_full.rename(columns={"category":"Kategori"}, inplace=True)
+
+                unique_categories = ["Semua Kategori"] + sorted(df_inventory_full["Kategori"].unique())
+                selected_category = st.selectbox("Pilih Kategori", unique_categories)
+                search_query = st.text_input("Cari berdasarkan Nama atau Kode")
+
+                df_filtered = filter_inventory_view(data.inventory, df_inventory_full, search_query, brand=brand)
+                if selected_category != "Semua Kategori":
+                    df_filtered = df_filtered[df_filtered["Kategori"] == selected_category]
+
+                st.markdown("### Preview Laporan")
+                st.dataframe(df_filtered, use_container_width=True, hide_index=True)
+
+                if not df_filtered.empty:
+                    st.download_button(
+                        label="Unduh Laporan Stok",
+                        data=export_reader(fmt, list(df_filtered.columns), lambda: frame_chunks(df_filtered),
+                                           sheet_name="Stok Barang Filtered"),
+                        file_name=f"Laporan_Inventori_{brand_cap}_Filter.{fmt}",
+                        mime=EXPORT_MIME[fmt], on_click="ignore",
+                    )
+                else:
+                    st.warning("Tidak ada data yang cocok dengan filter yang dipilih.")
 
-            if not df_filtered.empty:
-                @st.cache_data
-                def to_excel_bytes(df):
-                    return dataframe_to_excel_bytes(df, "Stok Barang Filtered")
-                excel_data = to_excel_bytes(df_filtered)
+        with tab_hist:
+            first_date = history_first_date(brand=brand)
+            if first_date is None:
+                st.info("Belum ada riwayat.")
+            else:
+                col1, col2, col3 = st.columns(3)
+                start_date = col1.date_input("Tanggal Mulai", value=first_date, key="exp_start")
+                end_date = col2.date_input("Tanggal Akhir", value=max(first_date, pd.Timestamp.today().date()), key="exp_end")
+                selected_action = col3.selectbox("Filter Tipe Aksi", ["Semua Tipe"] + HISTORY_ACTIONS, key="exp_action")
+                query = HistoryQuery(start_date=start_date, end_date=end_date,
+                                     actions=(selected_action,) if selected_action != "Semua Tipe" else (),
+                                     columns=tuple(HISTORY_SHOW_COLS))
+                total = _history_count_cached(brand, query, data_versions.get(HISTORY_TABLE))
+                st.caption(f"{total} baris riwayat akan diexport.")
+                if total:
+                    # Halaman keyset dari store langsung ditulis ke file, tidak pernah jadi satu DataFrame
+                    base_filters = _brand_filter(brand)
+                    st.download_button(
+                        label="Unduh Riwayat",
+                        data=export_reader(fmt, HISTORY_SHOW_COLS,
+                                           lambda: (pd.DataFrame(page) for page in iter_history_pages(db, query, base_filters)),
+                                           sheet_name="Riwayat"),
+                        file_name=f"Riwayat_{brand_cap}_{start_date}_{end_date}.{fmt}",
+                        mime=EXPORT_MIME[fmt], on_click="ignore",
+                    )
+
+        with tab_close:
+            today = pd.Timestamp.today().date()
+            last_month_end = today.replace(day=1) - pd.Timedelta(days=1)
+            col1, col2 = st.columns(2)
+            close_start = col1.date_input("Periode Mulai", value=last_month_end.replace(day=1), key="close_start")
+            close_end = col2.date_input("Periode Akhir", value=last_month_end, key="close_end")
+            if close_start > close_end:
+                st.error("Periode Mulai harus sebelum Periode Akhir.")
+            else:
+                if st.button("Hitung Ulang", help="Abaikan hasil tersimpan (mis. ada approve dengan tanggal mundur)"):
+                    _period_close_cached.clear()
+                sheets = load_period_close(close_start, close_end, brand=brand)
+                st.markdown("### Ringkasan Stok")
+                st.dataframe(sheets["Ringkasan Stok"], use_container_width=True, hide_index=True)
+                st.markdown("### OUT per Event")
+                st.dataframe(sheets["OUT per Event"], use_container_width=True, hide_index=True)
                 st.download_button(
-                    label="Unduh Laporan Excel",
-                    data=excel_data,
-                    file_name=f"Laporan_Inventori_{st.session_state.current_brand.capitalize()}_Filter.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    label="Unduh Laporan Tutup Periode (Excel)",
+                    data=workbook_reader(sheets),
+                    file_name=f"Tutup_Periode_{brand_cap}_{close_start}_{close_end}.xlsx",
+                    mime=EXPORT_MIME["xlsx"], on_click="ignore",
                 )
-            else:
-                st.warning("Tidak ada data yang cocok dengan filter yang dipilih.")
 
     elif menu == "Reset Database":
         st.markdown(f"## Reset Database - Brand {st.session_state.current_brand.capitalize()}")
@@ -793,13 +1018,7 @@ if role == "admin":
         st.warning("Aksi ini tidak dapat dibatalkan. Pending & riwayat akan dikosongkan (inventori aman).")
         confirm = st.text_input("Ketik RESET untuk konfirmasi")
         if st.button("Reset Database") and confirm == "RESET":
-            if ENABLE_BRAND:
-                supabase.from_("pending_gulavit").delete().eq("brand", brand).execute()
-                supabase.from_("history_gulavit").delete().eq("brand", brand).execute()
-            else:
-                supabase.from_("pending_gulavit").delete().neq("id", -1).execute()
-                supabase.from_("history_gulavit").delete().neq("id", -1).execute()
-            st.cache_data.clear()
+            reset_transactions(brand=brand)
             st.success("✅ Pending dan Riwayat berhasil direset!")
             _safe_rerun()
 
@@ -814,79 +1033,31 @@ elif role == "user":
         "Lihat Riwayat"
     ]
     menu = st.sidebar.radio("📌 Menu User", user_options)
+    data = PageData(menu, brand)
 
     if menu == "Dashboard":
-        render_dashboard_pro(df_hist, df_inv, brand_label=st.session_state.current_brand.capitalize(), allow_download=True)
+        render_dashboard_pro(data.inventory, brand_label=st.session_state.current_brand.capitalize(), brand=brand, allow_download=True)
 
     elif menu == "Stock Card":
-        st.markdown(f"## Stock Card Barang - Brand {st.session_state.current_brand.capitalize()}")
-        st.divider()
-        if df_hist.empty or df_inv.empty:
-            st.info("Belum ada riwayat transaksi atau master barang.")
-        else:
-            item_names = sorted(df_inv["name"].unique().tolist())
-            selected_item_name = st.selectbox("Pilih Barang", item_names)
-            if selected_item_name:
-                filtered_history = df_hist[df_hist["item"] == selected_item_name]
-                filtered_history = filtered_history[
-                    filtered_history["action"].astype(str).str.startswith(("APPROVE","ADD"))
-                ].copy()
-                if filtered_history.empty:
-                    st.info("Tidak ada riwayat transaksi yang disetujui untuk barang ini.")
-                else:
-                    stock_card_data = []
-                    current_balance = 0
-                    for _, h in filtered_history.sort_values("timestamp").iterrows():
-                        transaction_in = 0
-                        transaction_out = 0
-                        keterangan = "N/A"
-                        act = str(h["action"])
-                        if act == "ADD_ITEM":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = "Initial Stock"
-                        elif act == "APPROVE_IN":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = f"Request IN by {h['user']}"
-                            do_number = h.get('do_number', '-')
-                            if pd.notna(do_number) and do_number != '-': keterangan += f" (No. DO: {do_number})"
-                        elif act == "APPROVE_OUT":
-                            transaction_out = h["qty"]; current_balance -= transaction_out
-                            tipe = h.get("trans_type","-")
-                            keterangan = f"Request OUT ({tipe}) by {h['user']} for event: {h.get('event', '-')}"
-                        elif act == "APPROVE_RETURN":
-                            transaction_in = h["qty"]; current_balance += transaction_in
-                            keterangan = f"Retur by {h['user']} for event: {h.get('event', '-')}"
-                        else:
-                            continue
-                        stock_card_data.append({
-                            "Tanggal": h.get("date", h["timestamp"]),
-                            "Keterangan": keterangan,
-                            "Masuk (IN)": transaction_in if transaction_in > 0 else "-",
-                            "Keluar (OUT)": transaction_out if transaction_out > 0 else "-",
-                            "Saldo Akhir": current_balance
-                        })
-                    st.dataframe(pd.DataFrame(stock_card_data), use_container_width=True, hide_index=True)
+        render_stock_card(data.history, data.inventory, brand=brand)
 
     elif menu == "Request Barang IN":
         st.markdown(f"## Request Barang Masuk (Manual) - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_inv.empty:
+        if data.inventory.empty:
             st.info("Belum ada master barang. Silakan hubungi admin.")
         else:
-            items = df_inv.to_dict(orient="records")
             col1, col2 = st.columns(2)
-            idx = col1.selectbox(
-                "Pilih Barang", range(len(items)),
-                format_func=lambda x: f"{items[x]['name']} ({items[x]['qty']} {items[x].get('unit', '-')})"
-            )
+            item = item_picker(col1, data.inventory, "Pilih Barang", "pick_in", brand=brand,
+                               format_row=lambda r: f"{r['name']} ({r['qty']} {r.get('unit', '-')})")
             qty = col2.number_input("Jumlah", min_value=1, step=1)
 
             if st.button("Tambah Item IN"):
                 st.session_state.req_in_items.append({
-                    "item": items[idx]["name"],
-                    "code": items[idx]["code"],
+                    "item": item["name"],
+                    "code": item["code"],
                     "qty": int(qty),
-                    "unit": items[idx].get("unit","-"),
+                    "unit": item.get("unit","-"),
                     "event": "-"
                 })
                 st.success("Item IN ditambahkan ke daftar.")
@@ -921,14 +1092,14 @@ elif role == "user":
                     elif not uploaded_file:
                         st.error("PDF Surat Jalan wajib diupload.")
                     else:
-                        timestamp_str = datetime.now().strftime("%Y%m%d%H%M%S")
-                        file_ext = uploaded_file.name.split(".")[-1]
-                        attachment_path = os.path.join(UPLOADS_DIR, f"{st.session_state.username}_{timestamp_str}.{file_ext}")
-                        with open(attachment_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                        submit_count = 0
-                        new_state, new_flags = [], []
+                        try:
+                            # Disimpan per hash isi: upload ulang DO yang sama tidak menambah salinan
+                            attachment_path = attachments.put(uploaded_file, uploaded_file.name, refs=sum(mask))
+                        except AttachmentTooLarge as e:
+                            st.error(str(e))
+                            st.stop()
+
+                        batch, new_state, new_flags = [], [], []
                         for selected, rec in zip(mask, st.session_state.req_in_items):
                             if selected:
                                 base = {
@@ -944,33 +1115,31 @@ elif role == "user":
                                     "user": st.session_state.username,
                                     "timestamp": timestamp(),
                                 }
-                                norm = normalize_out_record(base)
-                                pending_insert("IN", norm, brand=brand)
-                                submit_count += 1
+                                batch.append(normalize_out_record(base))
                             else:
                                 new_state.append(rec); new_flags.append(False)
+                        pending_submit_batch("IN", batch, brand=brand)
                         st.session_state.req_in_items = new_state
                         st.session_state.in_select_flags = new_flags
-                        st.success(f"{submit_count} request IN diajukan & menunggu approval.")
+                        st.success(f"{len(batch)} request IN diajukan & menunggu approval.")
                         _safe_rerun()
 
     elif menu == "Request Barang OUT":
         st.markdown(f"## Request Barang Keluar (Multi Item) - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_inv.empty:
+        if data.inventory.empty:
             st.info("Belum ada master barang. Silakan hubungi admin.")
         else:
-            items = df_inv.to_dict(orient="records")
             col1, col2 = st.columns(2)
-            idx = col1.selectbox(
-                "Pilih Barang", range(len(items)),
-                format_func=lambda x: f"{items[x]['name']} (Stok: {items[x]['qty']} {items[x].get('unit','-')})"
-            )
-            max_qty = int(pd.to_numeric(items[idx].get("qty",0), errors="coerce") or 0)
+            item = item_picker(col1, data.inventory, "Pilih Barang", "pick_out", brand=brand,
+                               format_row=lambda r: f"{r['name']} (Tersedia: {r['available']} {r.get('unit','-')})")
+            # Tersedia = stok - pending OUT semua user - yang sudah ada di keranjang ini
+            in_cart = sum(int(r["qty"]) for r in st.session_state.req_out_items if r.get("code") == item["code"])
+            max_qty = max(int(item["available"]) - in_cart, 0)
             if max_qty < 1:
                 qty = 0
                 col2.number_input("Jumlah", min_value=0, max_value=0, step=1, value=0, disabled=True)
-                st.warning("Stok item ini 0. Tidak bisa menambah request OUT.")
+                st.warning("Stok tersedia item ini 0 (sudah dipesan pending OUT / keranjang). Tidak bisa menambah request OUT.")
             else:
                 qty = col2.number_input("Jumlah", min_value=1, max_value=max_qty, step=1)
 
@@ -979,7 +1148,7 @@ elif role == "user":
 
             if st.button("Tambah Item OUT (Manual)"):
                 if max_qty < 1:
-                    st.error("Stok 0 — tidak bisa menambah OUT untuk item ini.")
+                    st.error("Stok tersedia 0 — tidak bisa menambah OUT untuk item ini.")
                 elif not event_manual.strip():
                     st.error("Event wajib diisi.")
                 elif qty < 1:
@@ -987,10 +1156,10 @@ elif role == "user":
                 else:
                     base = {
                         "date": datetime.now().strftime("%Y-%m-%d"),
-                        "code": items[idx]["code"],
-                        "item": items[idx]["name"],
+                        "code": item["code"],
+                        "item": item["name"],
                         "qty": int(qty),
-                        "unit": items[idx].get("unit","-"),
+                        "unit": item.get("unit","-"),
                         "event": event_manual.strip(),
                         "trans_type": tipe,
                         "user": st.session_state.username,
@@ -1030,42 +1199,43 @@ elif role == "user":
                     if not any(mask):
                         st.warning("Pilih setidaknya satu item untuk diajukan.")
                     else:
-                        submitted = 0
-                        new_state, new_flags = [], []
+                        batch, new_state, new_flags = [], [], []
                         for selected, rec in zip(mask, st.session_state.req_out_items):
                             if selected:
-                                norm = normalize_out_record({**rec, "user": st.session_state.username})
-                                pending_insert("OUT", norm, brand=brand)
-                                submitted += 1
+                                batch.append(normalize_out_record({**rec, "user": st.session_state.username}))
                             else:
                                 new_state.append(rec); new_flags.append(False)
+                        try:
+                            pending_submit_batch("OUT", batch, brand=brand)
+                        except InsufficientStock as e:
+                            names = {r["code"]: r["item"] for r in batch}
+                            detail = ", ".join(f"{names.get(c, c)} (tersedia {a})" for c, a in e.shortages.items())
+                            st.error(f"Stok tidak cukup, request belum diajukan: {detail}")
+                            st.stop()
                         st.session_state.req_out_items = new_state
                         st.session_state.out_select_flags = new_flags
-                        st.success(f"{submitted} request OUT diajukan & menunggu approval.")
+                        st.success(f"{len(batch)} request OUT diajukan & menunggu approval.")
                         _safe_rerun()
 
     elif menu == "Request Retur":
         st.markdown(f"## Request Retur - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_inv.empty:
+        if data.inventory.empty:
             st.info("Belum ada master barang.")
         else:
-            items = df_inv.to_dict(orient="records")
             col1, col2 = st.columns(2)
-            idx = col1.selectbox(
-                "Pilih Barang", range(len(items)),
-                format_func=lambda x: f"{items[x]['name']} (Stok: {items[x]['qty']} {items[x].get('unit','-')})"
-            )
+            item = item_picker(col1, data.inventory, "Pilih Barang", "pick_ret", brand=brand,
+                               format_row=lambda r: f"{r['name']} (Stok: {r['qty']} {r.get('unit','-')})")
             qty = col2.number_input("Jumlah Retur", min_value=1, step=1)
             event_ret = st.text_input("Keterangan Retur / Event", placeholder="Misal: Sisa Event X")
 
             if st.button("Tambah Item Retur"):
                 base = {
                     "date": datetime.now().strftime("%Y-%m-%d"),
-                    "code": items[idx]["code"],
-                    "item": items[idx]["name"],
+                    "code": item["code"],
+                    "item": item["name"],
                     "qty": int(qty),
-                    "unit": items[idx].get("unit","-"),
+                    "unit": item.get("unit","-"),
                     "event": event_ret or "-",
                     "user": st.session_state.username,
                 }
@@ -1092,28 +1262,26 @@ elif role == "user":
                     if not any(mask):
                         st.warning("Pilih setidaknya satu item untuk diajukan.")
                     else:
-                        submitted = 0
-                        new_state, new_flags = [], []
+                        batch, new_state, new_flags = [], [], []
                         for selected, rec in zip(mask, st.session_state.req_ret_items):
                             if selected:
-                                pending_insert("RETURN", rec, brand=brand)
-                                submitted += 1
+                                batch.append(normalize_return_record({**rec, "user": st.session_state.username}))
                             else:
                                 new_state.append(rec); new_flags.append(False)
+                        pending_submit_batch("RETURN", batch, brand=brand)
                         st.session_state.req_ret_items = new_state
                         st.session_state.ret_select_flags = new_flags
-                        st.success(f"{submitted} request Retur diajukan & menunggu approval.")
+                        st.success(f"{len(batch)} request Retur diajukan & menunggu approval.")
                         _safe_rerun()
 
     elif menu == "Lihat Riwayat":
         st.markdown(f"## Riwayat - Brand {st.session_state.current_brand.capitalize()}")
         st.divider()
-        if df_hist.empty:
+        if history_first_date(brand=brand) is None:
             st.info("Belum ada riwayat.")
         else:
-            cols_show = ["action","date","code","item","qty","unit","stock","trans_type","user","event","do_number","timestamp"]
-            for c in cols_show:
-                if c not in df_hist.columns: df_hist[c] = None
-            st.dataframe(df_hist[cols_show].sort_values("timestamp", ascending=False), use_container_width=True, hide_index=True)
+            render_history_table(HistoryQuery(), brand=brand, key="riwayat_user")
 
+# Waktu render halaman utama (cold start = run pertama proses ini)
+timings.record("halaman", _run_start)
 
@@ -0,0 +1,102 @@
+# approvals.py
+# Engine approve request secara batch: validasi per baris, lalu satu transaksi di backend
+# (update stok per kode + insert riwayat + hapus pending). Gagal per baris dilaporkan, bukan di-raise.
+import math
+from datetime import datetime
+
+# Tanda perubahan stok per tipe request
+APPROVE_SIGN = {"IN": 1, "OUT": -1, "RETURN": 1}
+
+HISTORY_FIELDS = ["item", "unit", "user", "event", "do_number", "attachment", "date", "trans_type", "batch_id"]
+
+
+def _clean(v):
+    # NaN dari DataFrame -> None (JSON Supabase tidak menerima NaN)
+    if v is None:
+        return None
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+def _to_qty(v):
+    try:
+        q = float(v)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(q) or q != int(q):
+        return None
+    return int(q)
+
+
+def _month_key(*vals):
+    # Bulan efektif (YYYY-MM-01): date, fallback timestamp
+    for v in vals:
+        try:
+            return datetime.strptime(str(v)[:10], "%Y-%m-%d").strftime("%Y-%m-01")
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def build_approval_ops(rows, ts, brand=None):
+    # rows: list of dict (record pending). Return (ops, failures); op["row"] = posisi di rows.
+    ops, failures = [], []
+    for i, req in enumerate(rows):
+        rtype = str(_clean(req.get("type")) or "").upper()
+        code = _clean(req.get("code"))
+        qty = _to_qty(req.get("qty", 0))
+        pid = _clean(req.get("id"))
+        if rtype not in APPROVE_SIGN:
+            failures.append({"row": i, "code": code, "reason": f"Tipe request tidak dikenal: {rtype or '-'}"})
+            continue
+        if not code or code == "-":
+            failures.append({"row": i, "code": code, "reason": "Kode barang kosong"})
+            continue
+        if qty is None or qty <= 0:
+            failures.append({"row": i, "code": code, "reason": "Qty tidak valid"})
+            continue
+        history = {k: _clean(req.get(k)) for k in HISTORY_FIELDS}
+        history.update({
+            "action": f"APPROVE_{rtype}",
+            "item": history["item"] or "-",
+            "unit": history["unit"] or "-",
+            "user": history["user"] or "-",
+            "event": history["event"] or "-",
+            "do_number": history["do_number"] or "-",
+            "qty": qty,
+            "code": code,
+            "timestamp": ts,
+        })
+        if brand:
+            history["brand"] = brand
+        month = _month_key(history["date"], ts)
+        ops.append({
+            "row": i,
+            "pending_id": int(pid) if pid is not None else None,
+            "code": code,
+            "delta": APPROVE_SIGN[rtype] * qty,
+            # pending OUT mencadangkan stok (inventory.reserved) sampai diproses
+            "release": qty if rtype == "OUT" else 0,
+            "history": history,
+            # baris agregat bulanan yang ikut di-upsert dalam transaksi yang sama
+            "agg": {"month": month, "type_norm": rtype, "event": history["event"],
+                    "trans_type": history["trans_type"] or "-", "code": code, "brand": brand or "", "qty": qty},
+        })
+    return ops, failures
+
+
+def approve_requests(backend, rows, ts, brand=None) -> dict:
+    # Return {"approved": [{"row", "code", "stock"}], "failed": [{"row", "code", "reason"}]}
+    ops, failures = build_approval_ops(rows, ts, brand=brand)
+    approved = []
+    if ops:
+        res = backend.apply_approval_batch(ops)
+        for a in res.get("applied", []):
+            op = ops[a["index"]]
+            approved.append({"row": op["row"], "code": op["code"], "stock": a["stock"]})
+        for f in res.get("failed", []):
+            op = ops[f["index"]]
+            failures.append({"row": op["row"], "code": op["code"], "reason": f["reason"]})
+    failures.sort(key=lambda f: f["row"])
+    return {"approved": approved, "failed": failures}
@@ -0,0 +1,186 @@
+# attachments.py
+# Lampiran (PDF surat jalan) di folder uploads/. Baris riwayat hanya membawa referensi kecil
+# (nama file); isi file baru dibaca saat user klik unduh, bukan di-inline ke halaman.
+# File baru disimpan content-addressed: <sha256>.<ext>, satu salinan per isi, plus manifest.json.
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from storage import PENDING_TABLE, HISTORY_TABLE
+
+UPLOADS_DIR = "uploads"
+MANIFEST_NAME = "manifest.json"
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+WRITE_CHUNK_SIZE = 1024 * 1024
+# File yang baru di-upload belum tentu sudah dirujuk baris pending (insert menyusul) -> jangan di-GC dulu
+GC_GRACE_SECONDS = 3600
+
+
+def attachment_ref(path, root=UPLOADS_DIR):
+    # Path yang tersimpan di DB -> nama file, atau None jika kosong / file tidak ada
+    if not path or not isinstance(path, str):
+        return None
+    name = os.path.basename(path.replace("\\", "/"))
+    return name if name and os.path.isfile(os.path.join(root, name)) else None
+
+
+def attachment_path(ref, root=UPLOADS_DIR):
+    # Hanya file langsung di dalam root (tanpa traversal ../)
+    if not ref or os.path.basename(ref) != ref:
+        raise FileNotFoundError(ref)
+    path = os.path.join(root, ref)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(ref)
+    return path
+
+
+def attachment_mime(ref) -> str:
+    return mimetypes.guess_type(ref or "")[0] or "application/octet-stream"
+
+
+def attachment_reader(ref, root=UPLOADS_DIR):
+    # Callable tanpa argumen untuk st.download_button(data=...): dieksekusi hanya saat diklik
+    def read():
+        with open(attachment_path(ref, root), "rb") as f:
+            return f.read()
+    return read
+
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+
+class AttachmentStore:
+    # manifest: {ref: {"size", "mime", "name", "refs", "created"}}; refs = jumlah baris pending/riwayat
+    # yang menunjuk ref ini (ditambah saat upload, dihitung ulang dari DB saat gc)
+    def __init__(self, root=UPLOADS_DIR, max_bytes=MAX_ATTACHMENT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def original_name(self, ref) -> str:
+        # Nama file asli saat upload (dari manifest) untuk file_name unduhan; file lama tanpa manifest -> ref
+        name = (self.manifest().get(ref) or {}).get("name")
+        return os.path.basename(str(name).replace("\\", "/")) if name else ref
+
+    def _save_manifest(self, manifest):
+        # Tulis ke file sementara lalu os.replace supaya manifest tidak pernah setengah jadi
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".manifest-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def put(self, fileobj, filename, refs=1) -> str:
+        # Stream ke file sementara per chunk sambil di-hash; return ref "<sha256>.<ext>"
+        ext = os.path.splitext(filename or "")[1].lower()
+        digest, size = hashlib.sha256(), 0
+        os.makedirs(self.root, exist_ok=True)   # dibuat saat upload pertama, bukan saat startup
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if hasattr(fileobj, "seek"):
+                    fileobj.seek(0)
+                while True:
+                    chunk = fileobj.read(WRITE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLarge(f"Lampiran melebihi {self.max_bytes // (1024 * 1024)} MB.")
+                    digest.update(chunk)
+                    out.write(chunk)
+            ref = digest.hexdigest() + ext
+            with self._lock:
+                dest = os.path.join(self.root, ref)
+                if os.path.exists(dest):
+                    os.remove(tmp)   # isi sama sudah ada: pakai salinan yang lama
+                else:
+                    os.replace(tmp, dest)
+                manifest = self.manifest()
+                entry = manifest.setdefault(ref, {"size": size, "mime": attachment_mime(ref), "name": filename,
+                                                  "refs": 0, "created": time.time()})
+                entry["refs"] += refs
+                self._save_manifest(manifest)
+            return ref
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def gc(self, referenced, grace=GC_GRACE_SECONDS) -> list:
+        # referenced: semua nilai kolom attachment yang masih ada di DB (semua brand).
+        # Hanya file yang tercatat di manifest yang dikelola; file lama (user_timestamp.pdf) dibiarkan.
+        if not os.path.isdir(self.root):
+            return []
+        counts = {}
+        for path in referenced:
+            if path and isinstance(path, str):
+                name = os.path.basename(path.replace("\\", "/"))
+                counts[name] = counts.get(name, 0) + 1
+        removed, now = [], time.time()
+        with self._lock:
+            manifest = self.manifest()
+            for ref, entry in list(manifest.items()):
+                entry["refs"] = counts.get(ref, 0)
+                if entry["refs"] == 0 and now - entry.get("created", 0) > grace:
+                    try:
+                        os.remove(os.path.join(self.root, ref))
+                    except FileNotFoundError:
+                        pass
+                    del manifest[ref]
+                    removed.append(ref)
+            self._save_manifest(manifest)
+        return removed
+
+
+def referenced_attachments(backend, page_size=1000) -> list:
+    # Semua nilai attachment di pending & riwayat (tanpa filter brand: folder uploads dipakai bersama).
+    # Keyset pada id (tidak pernah NULL): timestamp NULL akan terlewat setelah halaman pertama
+    key = ("id",)
+    refs = []
+    for table in (PENDING_TABLE, HISTORY_TABLE):
+        after = None
+        while True:
+            page = backend.select_after(table, key, after, columns=["attachment", "id"], limit=page_size)
+            refs.extend(r.get("attachment") for r in page if r.get("attachment"))
+            if len(page) < page_size:
+                break
+            after = (page[-1]["id"],)
+    return refs
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def attachment_store(root=UPLOADS_DIR) -> AttachmentStore:
+    # Satu store per folder per proses (lock manifest harus dipakai bersama semua sesi)
+    with _STORES_LOCK:
+        if root not in _STORES:
+            _STORES[root] = AttachmentStore(root)
+        return _STORES[root]
+
+
+# python attachments.py gc  -> hapus file lampiran yang tidak lagi dirujuk pending/riwayat mana pun
+if __name__ == "__main__":
+    import argparse
+    from storage import backend_from_config, _cli_config
+    parser = argparse.ArgumentParser(description="Perawatan folder lampiran")
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--grace", type=int, default=GC_GRACE_SECONDS, help="umur minimum file (detik)")
+    args = parser.parse_args()
+    removed = attachment_store().gc(referenced_attachments(backend_from_config(_cli_config())), grace=args.grace)
+    print(f"{len(removed)} lampiran dihapus.")
@@ -0,0 +1,33 @@
+# datacache.py
+# Versi data per tabel (satu per proses) untuk invalidasi cache yang terarah.
+# Loader cached di app.py memasukkan versi tabel ke cache key: tulis ke inventory -> versi
+# inventory naik -> hanya entri inventory yang dianggap basi, tabel lain tetap dari cache.
+import threading
+
+
+class DataVersions:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}   # table -> int
+        self._listeners = []  # callable(tables) dipanggil setelah bump (mis. membangunkan loader snapshot)
+
+    def get(self, table) -> int:
+        return self._versions.get(table, 0)
+
+    def bump(self, *tables) -> dict:
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            bumped = {t: self._versions[t] for t in tables}
+        for fn in list(self._listeners):
+            fn(tables)
+        return bumped
+
+    def subscribe(self, fn):
+        with self._lock:
+            if fn not in self._listeners:
+                self._listeners.append(fn)
+
+
+# Modul ini di-import sekali per proses, jadi instance ini dibagi semua sesi Streamlit
+versions = DataVersions()
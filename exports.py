@@ -0,0 +1,104 @@
+# exports.py
+# Export laporan bertahap: baris ditulis per chunk ke file sementara (xlsxwriter constant_memory
+# atau CSV gzip), jadi memori tetap datar berapa pun jumlah barisnya. Dipanggil lewat
+# st.download_button(data=callable) supaya file baru dibuat saat tombol diklik.
+import gzip
+import io
+import math
+import tempfile
+import pandas as pd
+
+EXPORT_CHUNK_ROWS = 5000
+# label UI -> ekstensi file
+EXPORT_FORMATS = {"Excel (.xlsx)": "xlsx", "CSV terkompresi (.csv.gz)": "csv.gz"}
+EXPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv.gz": "application/gzip",
+}
+
+
+def frame_chunks(df: pd.DataFrame, size=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def _cell(v):
+    # xlsxwriter tidak menerima NaN/NaT/pd.NA (kolom nullable Int32/string)/np.int64 apa adanya
+    if v is None or (isinstance(v, float) and math.isnan(v)) or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if hasattr(v, "item"):
+        return v.item()
+    return v
+
+
+def _write_sheet(wb, sheet_name, columns, chunks, header_fmt):
+    ws = wb.add_worksheet(sheet_name[:31])
+    ws.write_row(0, 0, list(columns), header_fmt)
+    r = 1
+    for chunk in chunks:
+        for row in chunk.reindex(columns=list(columns)).itertuples(index=False, name=None):
+            ws.write_row(r, 0, [_cell(v) for v in row])
+            r += 1
+
+
+def _workbook(out):
+    # xlsxwriter di-import saat export pertama, bukan saat startup app
+    import xlsxwriter
+    return xlsxwriter.Workbook(out, {"constant_memory": True})
+
+
+def write_xlsx(out, columns, chunks, sheet_name="Sheet1"):
+    # constant_memory: tiap baris langsung di-flush ke file sementara xlsxwriter (baris harus urut)
+    wb = _workbook(out)
+    _write_sheet(wb, sheet_name, columns, chunks, wb.add_format({"bold": True}))
+    wb.close()
+
+
+def write_xlsx_sheets(out, sheets: dict):
+    # sheets: {nama sheet: DataFrame}; ditulis berurutan, sheet demi sheet
+    wb = _workbook(out)
+    header_fmt = wb.add_format({"bold": True})
+    for name, df in sheets.items():
+        _write_sheet(wb, name, list(df.columns), frame_chunks(df), header_fmt)
+    wb.close()
+
+
+def write_csv_gz(out, columns, chunks):
+    # utf-8-sig supaya Excel membaca huruf non-ASCII dengan benar
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        text = io.TextIOWrapper(gz, encoding="utf-8-sig", newline="")
+        pd.DataFrame(columns=list(columns)).to_csv(text, index=False)
+        for chunk in chunks:
+            chunk.reindex(columns=list(columns)).to_csv(text, index=False, header=False)
+        text.flush()
+        text.detach()
+
+
+def export_file(fmt, columns, chunks, sheet_name="Sheet1"):
+    # Return file sementara (sudah di-seek ke awal) berisi laporan dalam format fmt
+    out = tempfile.TemporaryFile()
+    if fmt == "xlsx":
+        write_xlsx(out, columns, chunks, sheet_name=sheet_name)
+    elif fmt == "csv.gz":
+        write_csv_gz(out, columns, chunks)
+    else:
+        raise ValueError(f"Format export tidak dikenal: {fmt}")
+    out.seek(0)
+    return out
+
+
+def export_reader(fmt, columns, make_chunks, sheet_name="Sheet1"):
+    # Callable tanpa argumen untuk st.download_button; make_chunks() dipanggil saat diklik
+    return lambda: export_file(fmt, columns, make_chunks(), sheet_name=sheet_name)
+
+
+def workbook_reader(sheets: dict):
+    # Callable untuk st.download_button: workbook multi-sheet dibuat saat diklik
+    def build():
+        out = tempfile.TemporaryFile()
+        write_xlsx_sheets(out, sheets)
+        out.seek(0)
+        return out
+    return build
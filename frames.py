@@ -0,0 +1,44 @@
+# frames.py
+# Skema dtype frame in-memory (inventory, riwayat): angka di-downcast ke int32, kolom berkardinalitas
+# rendah jadi category, stok "-" pada baris REJECT jadi Int32 nullable (<NA>) bukan object.
+# Frame ini di-cache per proses dan dipakai semua sesi, jadi ukurannya menentukan jumlah sesi per container.
+import pandas as pd
+
+INVENTORY_SCHEMA = {
+    "qty": "int32", "reserved": "int32", "available": "int32",
+    "unit": "category", "category": "category", "brand": "category",
+}
+HISTORY_SCHEMA = {
+    "qty": "int32", "stock": "Int32",
+    # item/code berulang di banyak baris (jumlah barang << jumlah baris riwayat)
+    "item": "category", "code": "category",
+    "action": "category", "type_norm": "category", "event": "category", "trans_type": "category",
+    "unit": "category", "user": "category", "brand": "category",
+}
+
+
+def compact_frame(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    # Kolom yang tidak ada di df dilewati; int32 -> NaN/teks jadi 0, Int32 -> NaN/teks ("-") jadi <NA>
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype == "Int32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int32")
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+    return df
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def footprint_report(frames: dict) -> pd.DataFrame:
+    # frames: {nama: DataFrame} -> satu baris per frame, plus total
+    rows = [{"Data": name, "Baris": len(df), "Kolom": len(df.columns), "Memori (KB)": round(frame_bytes(df) / 1024, 1)}
+            for name, df in frames.items()]
+    rows.append({"Data": "Total", "Baris": sum(r["Baris"] for r in rows), "Kolom": None,
+                 "Memori (KB)": round(sum(r["Memori (KB)"] for r in rows), 1)})
+    return pd.DataFrame(rows)
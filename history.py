@@ -0,0 +1,318 @@
+# history.py
+# Loader riwayat (history_gulavit) bertahap: watermark lokal pada id (diberikan server, selalu naik),
+# jadi refresh hanya mengambil baris yang disimpan setelah sync terakhir.
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+import pandas as pd
+from storage import HISTORY_TABLE, MONTHLY_TABLE
+from stock_card import MovementIndex
+from frames import HISTORY_SCHEMA, compact_frame
+
+# Watermark sync & paging bertahap memakai id, bukan timestamp: timestamp bisa NULL (cursor berhenti di situ),
+# dan baris dari jurnal write-behind membawa timestamp saat klik tetapi baru tersimpan setelah baris lain
+# yang lebih baru -> watermark (timestamp, id) akan melewatinya
+SYNC_KEY = ("id",)
+# <= batas baris default PostgREST (1000), supaya halaman tidak terpotong diam-diam
+HISTORY_PAGE_SIZE = 1000
+
+# Semua nilai 'action' yang ditulis app.py; prefix (APPROVE_, ADD_) diterjemahkan ke IN (...)
+HISTORY_ACTIONS = ["ADD_ITEM", "APPROVE_IN", "APPROVE_OUT", "APPROVE_RETURN", "REJECT_IN", "REJECT_OUT", "REJECT_RETURN"]
+
+
+class IncrementalHistory:
+    def __init__(self, backend, filters=None, table=HISTORY_TABLE, page_size=HISTORY_PAGE_SIZE, columns=None):
+        self.backend = backend
+        self.filters = list(filters or [])
+        self.columns = list(columns) if columns else None   # None = semua kolom; harus memuat "id"
+        self.table = table
+        self.page_size = page_size
+        self.frame = pd.DataFrame()
+        self.watermark = None   # (id,) baris terakhir yang sudah dimuat
+        self.index = MovementIndex()   # kode -> posisi baris di self.frame, ikut diperpanjang tiap sync
+        self._lock = threading.Lock()
+
+    def _fetch_new(self) -> list:
+        rows = []
+        while True:
+            page = self.backend.select_after(self.table, SYNC_KEY, self.watermark,
+                                             filters=self.filters, columns=self.columns or "*",
+                                             limit=self.page_size)
+            if not page:
+                break
+            rows.extend(page)
+            last = page[-1]
+            self.watermark = (last[SYNC_KEY[0]],)
+            if len(page) < self.page_size:
+                break
+        return rows
+
+    def sync(self) -> pd.DataFrame:
+        # O(baris baru): hanya halaman setelah watermark yang diambil lalu di-append. Satu count (HEAD) per sync
+        # mendeteksi riwayat yang menyusut (Reset Database dari proses/sesi lain) -> muat ulang penuh.
+        with self._lock:
+            rows = self._fetch_new()
+            known = len(self.frame) + len(rows)
+            if self.watermark is not None and self.backend.count(self.table, self.filters) < known:
+                self._clear()
+                rows = self._fetch_new()
+            if rows:
+                # Normalisasi (tipe, tanggal, kategori) hanya untuk baris baru, sekali per sync
+                new = normalize_history(pd.DataFrame(rows))
+                self.frame = concat_history(self.frame, new)
+                self.index.extend(new)
+            return self.frame
+
+    def _clear(self):
+        self.frame = pd.DataFrame()
+        self.watermark = None
+        self.index = MovementIndex()
+
+    def reset(self):
+        # Dipakai setelah baris riwayat dihapus (Reset Database)
+        with self._lock:
+            self._clear()
+
+
+_LOADERS = {}
+_LOADERS_LOCK = threading.Lock()
+
+
+def history_loader(backend, filters=None, columns=None) -> IncrementalHistory:
+    # Satu loader per (backend, filter, kolom) per proses
+    key = (id(backend), tuple(filters or []), tuple(columns or ()))
+    with _LOADERS_LOCK:
+        if key not in _LOADERS:
+            _LOADERS[key] = IncrementalHistory(backend, filters, columns=columns)
+        return _LOADERS[key]
+
+
+def reset_history_loaders():
+    with _LOADERS_LOCK:
+        for loader in _LOADERS.values():
+            loader.reset()
+
+
+# ================== QUERY BUILDER (pushdown ke store) ==================
+def _like_escape(s):
+    return str(s).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass(frozen=True)
+class HistoryQuery:
+    # Semua field opsional; frozen supaya bisa jadi cache key st.cache_data
+    start_date: date = None
+    end_date: date = None
+    action_prefixes: tuple = ()   # mis. ("APPROVE_",) -> action IN (APPROVE_IN, APPROVE_OUT, ...)
+    actions: tuple = ()
+    users: tuple = ()
+    items: tuple = ()             # nama barang persis
+    item_search: str = ""         # substring nama barang (case-insensitive)
+    columns: tuple = ()           # kosong = semua kolom
+
+    def action_values(self) -> list:
+        vals = list(self.actions)
+        for p in self.action_prefixes:
+            vals += [a for a in HISTORY_ACTIONS if a.startswith(p)]
+        return sorted(set(vals))
+
+    def filters(self) -> list:
+        flt = []
+        # Tanggal efektif = date, fallback ke timestamp jika date kosong (sama seperti prepare_history_df)
+        if self.start_date or self.end_date:
+            by_date, by_ts = [], [("date", "is", None)]
+            if self.start_date:
+                by_date.append(("date", "gte", self.start_date.isoformat()))
+                by_ts.append(("timestamp", "gte", self.start_date.isoformat()))
+            if self.end_date:
+                by_date.append(("date", "lte", self.end_date.isoformat()))
+                by_ts.append(("timestamp", "lt", (self.end_date + timedelta(days=1)).isoformat()))
+            flt.append((None, "or", [by_date, by_ts]))
+        if self.action_prefixes or self.actions:
+            flt.append(("action", "in", self.action_values()))
+        if self.users:
+            flt.append(("user", "in", list(self.users)))
+        if self.items:
+            flt.append(("item", "in", list(self.items)))
+        if self.item_search:
+            flt.append(("item", "ilike", f"%{_like_escape(self.item_search)}%"))
+        return flt
+
+    def select_columns(self):
+        if not self.columns:
+            return "*"
+        # kolom keyset wajib ikut supaya pagination jalan
+        return list(dict.fromkeys(list(self.columns) + list(SYNC_KEY)))
+
+
+def iter_history_pages(backend, query: HistoryQuery, base_filters=None, page_size=HISTORY_PAGE_SIZE):
+    # Generator list baris per halaman, urut id (timestamp bisa NULL -> tidak dipakai sebagai cursor);
+    # dipakai fetch_history & export bertahap
+    filters = list(base_filters or []) + query.filters()
+    columns = query.select_columns()
+    after = None
+    while True:
+        page = backend.select_after(HISTORY_TABLE, SYNC_KEY, after, columns=columns, filters=filters, limit=page_size)
+        if page:
+            yield page
+        if len(page) < page_size:
+            break
+        after = (page[-1][SYNC_KEY[0]],)
+
+
+def fetch_history(backend, query: HistoryQuery, base_filters=None, page_size=HISTORY_PAGE_SIZE) -> pd.DataFrame:
+    # Hanya baris & kolom yang lolos query yang ditransfer; tetap dipaging pada id
+    rows = [r for page in iter_history_pages(backend, query, base_filters, page_size) for r in page]
+    columns = query.select_columns()
+    df = pd.DataFrame(rows)
+    if df.empty and columns != "*":
+        df = pd.DataFrame(columns=columns)
+    return df
+
+
+# ================== TABEL RIWAYAT BERHALAMAN ==================
+# Label -> (kolom urut, desc); id jadi tie-breaker. Kolom urut boleh NULL (timestamp data lama): baris
+# bernilai dipaging keyset (kolom, id), baris NULL menyusul di akhir, dipaging pada id saja.
+HISTORY_SORTS = {
+    "Terbaru": ("timestamp", True),
+    "Terlama": ("timestamp", False),
+    "Tipe Aksi": ("action", False),
+}
+HISTORY_PAGE_SIZES = [25, 50, 100, 200]
+
+
+def fetch_history_page(backend, query: HistoryQuery, base_filters=None, sort=("timestamp", True),
+                       after=None, page_size=50) -> tuple:
+    # Satu halaman setelah cursor `after` = (nilai kolom urut, id); nilai None = sudah di bagian baris NULL.
+    # Return (df, cursor halaman berikut | None)
+    col, desc = sort
+    columns = query.select_columns()
+    if columns != "*":
+        columns = list(dict.fromkeys(list(columns) + [col, "id"]))
+    filters = list(base_filters or []) + query.filters()
+    # ambil 1 baris ekstra untuk tahu apakah masih ada halaman berikutnya
+    rows = []
+    if after is None or after[0] is not None:
+        rows = backend.select_after(HISTORY_TABLE, (col, "id"), after, columns=columns,
+                                    filters=filters + [(col, "not.is", None)], limit=page_size + 1, desc=desc)
+    if len(rows) <= page_size:
+        null_after = (after[1],) if after is not None and after[0] is None else None
+        rows += backend.select_after(HISTORY_TABLE, ("id",), null_after, columns=columns,
+                                     filters=filters + [(col, "is", None)], limit=page_size + 1 - len(rows),
+                                     desc=desc)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=[] if columns == "*" else columns)
+    cursor = (rows[-1][col], rows[-1]["id"]) if has_next else None
+    return df, cursor
+
+
+def count_history(backend, query: HistoryQuery, base_filters=None) -> int:
+    return backend.count(HISTORY_TABLE, list(base_filters or []) + query.filters())
+
+
+# ================== NORMALISASI (Dashboard, Stock Card, laporan) ==================
+# Format yang ditulis app.py; nilai lain (data lama) di-parse ulang per elemen, hanya untuk sisanya
+DATE_FORMAT = "%Y-%m-%d"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+HISTORY_CATEGORIES = ["action", "event", "trans_type", "unit", "user"]
+
+
+def _action_type_norm(action) -> str:
+    # Dievaluasi per nilai unik action (kategori), bukan per baris
+    a = str(action).upper()
+    if "APPROVE_RETURN" in a: return "RETURN"
+    if "APPROVE_OUT" in a: return "OUT"
+    if "APPROVE_IN" in a: return "IN"
+    if a == "ADD_ITEM": return "ADD"
+    return "-"
+
+
+def _parse_datetime(s: pd.Series, fmt) -> pd.Series:
+    out = pd.to_datetime(s, format=fmt, errors="coerce")
+    rest = out.isna() & s.notna() & (s.astype(str).str.len() > 0)
+    if rest.any():
+        out[rest] = pd.to_datetime(s[rest], format="mixed", errors="coerce")
+    return out
+
+
+def normalize_history(df_hist_raw: pd.DataFrame) -> pd.DataFrame:
+    # Riwayat bertipe, dibangun sekali per batch baris: date_eff (date, fallback timestamp), type_norm dari
+    # tabel lookup per kategori action, lalu dtype ringkas frames.HISTORY_SCHEMA (int32/category/Int32).
+    # Urutan & jumlah baris tidak berubah (posisi MovementIndex tetap berlaku).
+    df = df_hist_raw.copy()
+    if df.empty: return df
+    for c in ["qty","date","timestamp","action","item","event","trans_type","unit","user"]:
+        if c not in df.columns: df[c] = None
+    s_date = _parse_datetime(df["date"], DATE_FORMAT)
+    s_ts = _parse_datetime(df["timestamp"], TIMESTAMP_FORMAT)
+    df["date_eff"] = s_date.fillna(s_ts).dt.floor("D")
+    for c in HISTORY_CATEGORIES:
+        df[c] = df[c].astype(object).where(df[c].notna(), "-" if c != "action" else "").astype(str).astype("category")
+    lookup = {a: _action_type_norm(a) for a in df["action"].cat.categories}
+    df["type_norm"] = df["action"].map(lookup).astype("category")
+    return compact_frame(df, HISTORY_SCHEMA)
+
+
+def concat_history(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    # Gabung dua frame hasil normalize_history tanpa kehilangan dtype kategori (kategori digabung)
+    if a.empty: return b
+    if b.empty: return a
+    a = a.copy(deep=False)   # frame lama bisa sedang dipegang snapshot bersama: jangan diubah di tempat
+    for c in [c for c, t in HISTORY_SCHEMA.items() if t == "category"]:
+        if c in a.columns and c in b.columns and a[c].dtype == "category" and b[c].dtype == "category":
+            cats = a[c].cat.categories.union(b[c].cat.categories)
+            a[c] = a[c].cat.set_categories(cats)
+            b[c] = b[c].cat.set_categories(cats)
+    return pd.concat([a, b], ignore_index=True)
+
+
+def prepare_history_df(df_hist_raw: pd.DataFrame, keep=("IN", "OUT", "RETURN")) -> pd.DataFrame:
+    # Baris mutasi stok dengan type_norm di keep (ADD_ITEM -> "ADD", hanya jika diminta) & tanggal valid.
+    # Menerima riwayat mentah atau yang sudah dinormalisasi (tidak di-parse ulang).
+    df = df_hist_raw if "type_norm" in df_hist_raw.columns else normalize_history(df_hist_raw)
+    if df.empty: return df
+    return df[df["type_norm"].isin(list(keep)) & df["date_eff"].notna()].copy()
+
+
+# ================== AGREGAT BULANAN (Dashboard) ==================
+MONTHLY_COLS = ["month", "type_norm", "event", "trans_type", "code", "qty"]
+
+
+def split_month_range(start_date: date, end_date: date):
+    # [start, end] -> (bulan penuh [m0, m1) dari tabel agregat, list rentang hari sisa di tepi)
+    first_full = start_date if start_date.day == 1 else (pd.Timestamp(start_date) + pd.offsets.MonthBegin(1)).date()
+    after_end = end_date + timedelta(days=1)
+    last_full_excl = after_end if after_end.day == 1 else after_end.replace(day=1)
+    if first_full >= last_full_excl:
+        return None, [(start_date, end_date)]
+    edges = []
+    if start_date < first_full:
+        edges.append((start_date, first_full - timedelta(days=1)))
+    if last_full_excl <= end_date:
+        edges.append((last_full_excl, end_date))
+    return (first_full, last_full_excl), edges
+
+
+def fetch_monthly(backend, month_start: date, month_end_excl: date, base_filters=None) -> pd.DataFrame:
+    # Ukuran hasil ~ bulan x tipe x event x kode, tidak tergantung panjang riwayat
+    filters = list(base_filters or []) + [("month", "gte", month_start.isoformat()),
+                                          ("month", "lt", month_end_excl.isoformat())]
+    df = pd.DataFrame(backend.select(MONTHLY_TABLE, columns=MONTHLY_COLS, filters=filters), columns=MONTHLY_COLS)
+    df["month"] = pd.to_datetime(df["month"], errors="coerce")
+    df["qty"] = pd.to_numeric(df["qty"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def monthly_from_prepared(df_prepared: pd.DataFrame) -> pd.DataFrame:
+    # Riwayat hasil prepare_history_df -> bentuk yang sama dengan tabel agregat
+    if df_prepared.empty:
+        return pd.DataFrame(columns=MONTHLY_COLS)
+    d = df_prepared.copy()
+    d["month"] = d["date_eff"].dt.to_period("M").dt.to_timestamp()
+    if "code" not in d.columns:
+        d["code"] = "-"
+    d["code"] = d["code"].astype(object).fillna("-")
+    for c in ("type_norm", "event", "trans_type"):
+        d[c] = d[c].astype(str)
+    return d.groupby(MONTHLY_COLS[:-1], as_index=False)["qty"].sum()
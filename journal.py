@@ -0,0 +1,228 @@
+# journal.py
+# Write-behind untuk baris riwayat/audit (ADD_ITEM, REJECT_*, import master): baris ditulis dulu ke jurnal
+# SQLite lokal (append-only, fsync), klik langsung kembali; satu thread latar belakang mengirimnya ke backend
+# per batch sesuai urutan jurnal. Baris dihapus dari jurnal hanya setelah backend menerimanya, jadi setelah
+# crash/restart sisa jurnal dikirim ulang. Tiap baris membawa request_key -> kirim ulang tidak membuat dobel.
+# Baris APPROVE_* tetap ditulis di transaksi approve (sql/approve_pending_batch.sql), bukan lewat sini.
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datacache import versions as data_versions
+from storage import IDEMPOTENT_INSERTS
+
+JOURNAL_PATH = "history_journal.db"
+FLUSH_BATCH = 200        # baris per insert ke backend
+RETRY_DELAY = (1, 30)    # detik: jeda awal & maksimum (dobel tiap gagal) saat backend tidak bisa dihubungi
+MAX_ATTEMPTS = 5         # gagal non-transien sebanyak ini -> entri dipindah ke dead_letter (antrean tidak macet)
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL, payload TEXT NOT NULL,
+    created REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    seq INTEGER PRIMARY KEY, target TEXT NOT NULL, payload TEXT NOT NULL,
+    created REAL NOT NULL, attempts INTEGER NOT NULL, last_error TEXT
+);
+"""
+
+
+def _transient(ex) -> bool:
+    # Backend tidak terjangkau / sibuk -> tunggu saja (tidak dihitung sebagai percobaan gagal).
+    # OperationalError SQLite lain (mis. "no such column") permanen -> dihitung, akhirnya ke dead_letter.
+    if isinstance(ex, sqlite3.OperationalError):
+        msg = str(ex).lower()
+        return "locked" in msg or "busy" in msg
+    code = str(getattr(ex, "code", ""))
+    return (type(ex).__module__.split(".")[0] in ("httpx", "httpcore") or isinstance(ex, OSError)
+            or code in ("408", "429") or (len(code) == 3 and code.startswith("5")))
+
+
+class WriteBehindJournal:
+    def __init__(self, backend, path=JOURNAL_PATH, batch=FLUSH_BATCH, versions=data_versions):
+        self.backend = backend
+        self.path = path
+        self.batch = batch
+        self.versions = versions
+        self.last_error = None
+        self.flushed = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()   # satu flush dalam satu waktu (urutan terjaga)
+        self._wake = threading.Event()
+        self._idle = threading.Condition()
+        self._conn().executescript(JOURNAL_SCHEMA)
+        # Sisa jurnal dari proses sebelumnya (crash/restart) langsung dikirim ulang oleh thread ini
+        self._thread = threading.Thread(target=self._run, name="history-journal", daemon=True)
+        self._thread.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")   # entri yang sudah di-append tahan crash/mati listrik
+            self._local.conn = conn
+        return conn
+
+    def append(self, table, rows) -> list:
+        # Return baris yang dijurnal (request_key sudah terisi); backend menerimanya beberapa saat kemudian
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        key = IDEMPOTENT_INSERTS.get(table)
+        if key:
+            rows = [{**r, key: r.get(key) or uuid.uuid4().hex} for r in rows]
+        if rows:
+            now = time.time()
+            self._conn().executemany("INSERT INTO journal (target, payload, created) VALUES (?, ?, ?)",
+                                     [(table, json.dumps(r, default=str), now) for r in rows])
+            self._wake.set()
+        return rows
+
+    def backlog(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM journal").fetchone()[0])
+
+    def status(self) -> dict:
+        conn = self._conn()
+        pending, oldest = conn.execute("SELECT COUNT(*), MIN(created) FROM journal").fetchone()
+        dead = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {"Antrean": pending, "Umur tertua (detik)": round(time.time() - oldest, 1) if oldest else 0,
+                "Terkirim": self.flushed, "Dead letter": dead, "Error terakhir": self.last_error or "-"}
+
+    def flush_once(self) -> int:
+        # Kirim entri terdepan (urut seq) per tabel tujuan; berhenti di kegagalan pertama supaya urutan terjaga.
+        # Return jumlah baris terkirim.
+        with self._lock:
+            conn = self._conn()
+            entries = conn.execute("SELECT seq, target, payload, attempts FROM journal ORDER BY seq LIMIT ?",
+                                   (self.batch,)).fetchall()
+            sent, touched, error = 0, set(), None
+            while entries and error is None:
+                table = entries[0][1]
+                run = []
+                for e in entries:
+                    if e[1] != table:
+                        break
+                    run.append(e)
+                entries = entries[len(run):]
+                n, error = self._send(conn, table, run)
+                sent += n
+                if n:
+                    touched.add(table)
+            self.last_error = error
+            if touched:
+                self.flushed += sent
+                self.versions.bump(*touched)
+            return sent
+
+    def _send(self, conn, table, run) -> tuple:
+        # Return (jumlah terkirim, error). Batch ditolak backend (bukan gangguan jaringan) -> dikirim satu per
+        # satu supaya baris rusak terisolasi dan baris sebelumnya tetap masuk sesuai urutan.
+        try:
+            self.backend.insert(table, [json.loads(e[2]) for e in run])
+        except Exception as ex:
+            if _transient(ex) or len(run) == 1:
+                error = f"{type(ex).__name__}: {ex}"[:300]
+                if not _transient(ex):
+                    self._failed(conn, run[0], error)
+                return 0, error
+            sent = 0
+            for e in run:
+                n, error = self._send(conn, table, [e])
+                sent += n
+                if error:
+                    return sent, error
+            return sent, None
+        conn.execute(f"DELETE FROM journal WHERE seq IN ({','.join('?' * len(run))})", [e[0] for e in run])
+        return len(run), None
+
+    def _failed(self, conn, entry, error):
+        seq, attempts = entry[0], entry[3]
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE seq = ?", (error, seq))
+        if attempts + 1 >= MAX_ATTEMPTS:
+            conn.execute("INSERT INTO dead_letter SELECT * FROM journal WHERE seq = ?", (seq,))
+            conn.execute("DELETE FROM journal WHERE seq = ?", (seq,))
+        conn.execute("COMMIT")
+
+    def discard(self, table, brand=None) -> int:
+        # Buang entri antrean & dead letter untuk tabel (brand None = semua) -> dipakai Reset Database supaya
+        # riwayat yang belum terkirim tidak muncul lagi setelah reset. Return jumlah entri yang dibuang.
+        with self._lock:   # batch yang sedang dikirim selesai dulu; sesudah ini tidak ada lagi yang terkirim
+            cond, params = "target = ?", [table]
+            if brand is not None:
+                cond += " AND json_extract(payload, '$.brand') = ?"
+                params.append(brand)
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            n = sum(conn.execute(f"DELETE FROM {t} WHERE {cond}", params).rowcount for t in ("journal", "dead_letter"))
+            conn.execute("COMMIT")
+            return n
+
+    def flush(self, timeout=30) -> bool:
+        # Tunggu jurnal kosong (CLI flush / requeue-dead); True jika kosong sebelum timeout
+        deadline = time.time() + timeout
+        while self.backlog():
+            if time.time() >= deadline:
+                return False
+            self._wake.set()
+            with self._idle:
+                self._idle.wait(0.05)
+        return True
+
+    def _run(self):
+        delay = RETRY_DELAY[0]
+        while True:
+            self._wake.clear()
+            try:
+                self.flush_once()
+                failed = self.last_error is not None and self.backlog() > 0
+            except Exception as ex:   # jurnal terkunci / disk penuh: coba lagi nanti
+                self.last_error = f"{type(ex).__name__}: {ex}"[:300]
+                failed = True
+            with self._idle:
+                self._idle.notify_all()
+            if failed:
+                self._wake.wait(delay)
+                delay = min(delay * 2, RETRY_DELAY[1])
+            elif self.backlog():
+                continue   # masih ada sisa di belakang batch ini
+            else:
+                delay = RETRY_DELAY[0]
+                self._wake.wait(5)
+
+
+_JOURNALS = {}
+_JOURNALS_LOCK = threading.Lock()
+
+
+def history_journal(backend, path=None) -> WriteBehindJournal:
+    # Satu jurnal (dan satu thread pengirim) per backend per proses
+    with _JOURNALS_LOCK:
+        if id(backend) not in _JOURNALS:
+            _JOURNALS[id(backend)] = WriteBehindJournal(backend, path or JOURNAL_PATH)
+        return _JOURNALS[id(backend)]
+
+
+# ================== CLI ==================
+# python journal.py status | flush | requeue-dead   (konfigurasi sama dengan app.py)
+if __name__ == "__main__":
+    import argparse
+    from storage import backend_from_config, _cli_config
+    parser = argparse.ArgumentParser(description="Jurnal write-behind riwayat")
+    parser.add_argument("command", choices=["status", "flush", "requeue-dead"])
+    args = parser.parse_args()
+    get = _cli_config()
+    j = WriteBehindJournal(backend_from_config(get), get("HISTORY_JOURNAL_PATH", JOURNAL_PATH))
+    if args.command == "requeue-dead":
+        conn = j._conn()
+        n = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO journal (seq, target, payload, created) "
+                     "SELECT seq, target, payload, created FROM dead_letter")
+        conn.execute("DELETE FROM dead_letter")
+        conn.execute("COMMIT")
+        print(f"{n} entri dead letter dimasukkan lagi ke antrean.")
+    if args.command in ("flush", "requeue-dead"):
+        print("Jurnal kosong." if j.flush(timeout=120) else f"Masih {j.backlog()} entri (lihat status).")
+    print(j.status())
@@ -0,0 +1,73 @@
+# master_import.py
+# Import master barang dari Excel: validasi seluruh sheet sekaligus (vektor), lalu insert inventory
+# dan riwayat ADD_ITEM per chunk (satu request per chunk, bukan per baris).
+import pandas as pd
+from storage import INVENTORY_TABLE, HISTORY_TABLE
+
+MASTER_COLUMNS = ["Kode Barang", "Nama Barang", "Qty", "Satuan", "Kategori"]
+IMPORT_CHUNK_SIZE = 500
+
+
+def _text(s: pd.Series, default) -> pd.Series:
+    out = s.astype(object).where(s.notna(), "").astype(str).str.strip()
+    return out.where(out != "", default)
+
+
+def validate_master_sheet(df_new: pd.DataFrame, existing_codes) -> tuple:
+    # Return (df_valid [code, name, qty, unit, category], errors [Baris, Kode, Alasan])
+    df = pd.DataFrame({
+        "row": df_new.index.to_numpy() + 2,   # nomor baris Excel (header = baris 1)
+        "code": _text(df_new["Kode Barang"], "").to_numpy(),
+        "name": _text(df_new["Nama Barang"], "").to_numpy(),
+        "unit": _text(df_new["Satuan"], "-").to_numpy(),
+        "category": _text(df_new["Kategori"], "Uncategorized").to_numpy(),
+    })
+    raw_qty = df_new["Qty"].reset_index(drop=True)
+    qty = pd.to_numeric(raw_qty, errors="coerce")
+    blank_qty = raw_qty.isna() | (raw_qty.astype(str).str.strip() == "")
+    qty = qty.where(~blank_qty, 0)
+
+    reason = pd.Series("", index=df.index, dtype=object)
+
+    def flag(mask, text):
+        mask = pd.Series(mask, index=df.index) & (reason == "")
+        reason[mask] = text
+
+    flag((df["code"] == "") | (df["name"] == ""), "Kode/Nama wajib.")
+    flag(qty.isna(), "Qty bukan angka.")
+    flag(qty.notna() & ((qty < 0) | (qty % 1 != 0)), "Qty harus bilangan bulat >= 0.")
+    flag(df["code"].isin(set(existing_codes)), "Kode sudah ada.")
+    flag(df["code"].duplicated(keep="first") & (df["code"] != ""), "Kode duplikat di file.")
+
+    bad = reason != ""
+    errors = pd.DataFrame({"Baris": df.loc[bad, "row"], "Kode": df.loc[bad, "code"], "Alasan": reason[bad]})
+    valid = df.loc[~bad].copy()
+    valid["qty"] = qty[~bad].astype(int)
+    return valid.reset_index(drop=True), errors.reset_index(drop=True)
+
+
+def import_master(backend, df_valid: pd.DataFrame, user, ts, brand=None, chunk_size=IMPORT_CHUNK_SIZE,
+                  history_sink=None) -> tuple:
+    # Return (jumlah item ditambahkan, errors [Baris, Kode, Alasan] untuk chunk yang gagal disimpan).
+    # history_sink(rows): penulis riwayat ADD_ITEM (mis. jurnal write-behind); default insert langsung ke backend
+    write_history = history_sink or (lambda rows: backend.insert(HISTORY_TABLE, rows))
+    added, failed = 0, []
+    for start in range(0, len(df_valid), chunk_size):
+        chunk = df_valid.iloc[start:start + chunk_size]
+        inv_rows = [{"code": r.code, "item": r.name, "qty": int(r.qty), "unit": r.unit, "category": r.category}
+                    for r in chunk.itertuples(index=False)]
+        hist_rows = [{"action": "ADD_ITEM", "code": r.code, "item": r.name, "qty": int(r.qty), "stock": int(r.qty),
+                      "unit": r.unit, "user": user, "event": "-", "timestamp": ts}
+                     for r in chunk.itertuples(index=False)]
+        if brand:
+            for row in inv_rows + hist_rows:
+                row["brand"] = brand
+        try:
+            backend.insert(INVENTORY_TABLE, inv_rows)
+        except Exception as e:
+            failed.append(pd.DataFrame({"Baris": chunk["row"], "Kode": chunk["code"], "Alasan": f"Gagal disimpan: {e}"}))
+            continue
+        write_history(hist_rows)
+        added += len(chunk)
+    errors = pd.concat(failed, ignore_index=True) if failed else pd.DataFrame(columns=["Baris", "Kode", "Alasan"])
+    return added, errors
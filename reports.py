@@ -0,0 +1,91 @@
+# reports.py
+# Laporan tutup periode: stok awal, barang baru, IN, OUT per trans_type, RETURN, stok akhir per kode,
+# plus total OUT per event. Semua sheet diturunkan dari SATU groupby (code, bucket, event) atas
+# riwayat s/d akhir periode yang sudah dinormalisasi prepare_history_df.
+import numpy as np
+import pandas as pd
+from history import HistoryQuery, fetch_history, prepare_history_df
+from stock_card import resolve_codes
+
+REPORT_HIST_COLS = ("date", "timestamp", "action", "qty", "item", "code", "event", "trans_type")
+# Sama dengan STOCK_CARD_SIGN, dalam istilah type_norm
+PERIOD_SIGN = {"ADD": 1, "IN": 1, "OUT": -1, "RETURN": 1}
+OPENING = "OPEN"
+
+
+def fetch_period_history(backend, end_date, base_filters=None) -> pd.DataFrame:
+    # Semua mutasi stok s/d end_date (stok awal butuh seluruh riwayat sebelum periode)
+    query = HistoryQuery(end_date=end_date, actions=("ADD_ITEM",), action_prefixes=("APPROVE_",),
+                         columns=REPORT_HIST_COLS)
+    return fetch_history(backend, query, base_filters=base_filters)
+
+
+def _out_col(trans_type):
+    return f"OUT {trans_type}" if trans_type != "-" else "OUT Lainnya"
+
+
+def build_period_close(df_hist_raw: pd.DataFrame, df_inv: pd.DataFrame, start_date, end_date,
+                       trans_types=("Support", "Penjualan")) -> dict:
+    # Return {nama sheet: DataFrame}
+    inv = df_inv[["code", "name", "unit"]].drop_duplicates("code") if not df_inv.empty else \
+        pd.DataFrame(columns=["code", "name", "unit"])
+    d = prepare_history_df(df_hist_raw, keep=tuple(PERIOD_SIGN))
+    if not d.empty:
+        d["code"] = resolve_codes(d, dict(zip(inv["name"], inv["code"])))
+        d = d[d["date_eff"] <= pd.Timestamp(end_date)]
+        d = d.dropna(subset=["code"])
+    before = (d["date_eff"] < pd.Timestamp(start_date)).to_numpy() if not d.empty else np.zeros(0, bool)
+
+    if d.empty:
+        grouped = pd.DataFrame(columns=["code", "bucket", "event", "value"])
+    else:
+        # bucket: OPEN (saldo sebelum periode, bertanda) atau tipe mutasi dalam periode; OUT dipecah per trans_type
+        # type_norm/trans_type/event kategorikal: map per kategori, lalu ke array biasa
+        type_norm = d["type_norm"].astype(str)
+        bucket = np.where(type_norm == "OUT", d["trans_type"].map(_out_col).astype(str), type_norm)
+        bucket = np.where(before, OPENING, bucket)
+        value = np.where(before, d["qty"] * type_norm.map(PERIOD_SIGN).astype(int), d["qty"])
+        event = np.where(before, "-", d["event"].astype(str))
+        grouped = (pd.DataFrame({"code": d["code"].to_numpy(), "bucket": bucket, "event": event, "value": value})
+                   .groupby(["code", "bucket", "event"], as_index=False)["value"].sum())
+
+    out_cols = [_out_col(t) for t in trans_types]
+    out_cols += sorted(set(b for b in grouped["bucket"] if str(b).startswith("OUT ")) - set(out_cols))
+    cols = [OPENING, "ADD", "IN"] + out_cols + ["RETURN"]
+    per_code = grouped.groupby(["code", "bucket"])["value"].sum().unstack("bucket")
+    per_code = per_code.reindex(columns=cols).fillna(0).astype(int)
+    per_code = per_code.reindex(per_code.index.union(pd.Index(inv["code"]))).fillna(0).astype(int)
+    per_code["Stok Akhir"] = (per_code[OPENING] + per_code["ADD"] + per_code["IN"]
+                              - per_code[out_cols].sum(axis=1) + per_code["RETURN"])
+    per_code["Total OUT"] = per_code[out_cols].sum(axis=1)
+
+    summary = (per_code.rename_axis("code").reset_index().merge(inv, on="code", how="left")
+               .rename(columns={"code": "Kode", "name": "Nama Barang", "unit": "Satuan", OPENING: "Stok Awal",
+                                "ADD": "Barang Baru"}))
+    summary = summary[["Kode", "Nama Barang", "Satuan", "Stok Awal", "Barang Baru", "IN"] + out_cols
+                      + ["Total OUT", "RETURN", "Stok Akhir"]].sort_values("Kode", kind="mergesort")
+
+    outs = grouped[grouped["bucket"].isin(out_cols)]
+    by_event = outs.pivot_table(index="event", columns="bucket", values="value", aggfunc="sum", fill_value=0)
+    by_event = by_event.reindex(columns=out_cols, fill_value=0).astype(int)
+    by_event["Total OUT"] = by_event.sum(axis=1)
+    by_event = (by_event.rename_axis(index="Event", columns=None).reset_index()
+                .sort_values("Total OUT", ascending=False, kind="mergesort"))
+
+    by_event_item = (outs.merge(inv, on="code", how="left").fillna({"name": "-"})
+                     .pivot_table(index=["event", "code", "name"], columns="bucket", values="value",
+                                  aggfunc="sum", fill_value=0)
+                     .reindex(columns=out_cols, fill_value=0).astype(int))
+    by_event_item["Total OUT"] = by_event_item.sum(axis=1)
+    by_event_item = (by_event_item.rename_axis(columns=None).reset_index()
+                     .rename(columns={"event": "Event", "code": "Kode", "name": "Nama Barang"}))
+
+    info = pd.DataFrame({"Keterangan": ["Periode Mulai", "Periode Akhir", "Jumlah Barang", "Dibuat"],
+                         "Nilai": [str(start_date), str(end_date), str(len(summary)),
+                                   pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")]})
+    return {
+        "Ringkasan Stok": summary.reset_index(drop=True),
+        "OUT per Event": by_event.reset_index(drop=True),
+        "OUT per Event & Barang": by_event_item,
+        "Info": info,
+    }
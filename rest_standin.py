@@ -0,0 +1,238 @@
+# rest_standin.py
+# Server pengganti PostgREST/Supabase lokal (di atas SQLiteBackend) untuk menguji SupabaseBackend + transport.py
+# tanpa jaringan: subset REST yang dipakai storage.py (select/filter/order/limit, count HEAD, insert/upsert,
+# update, delete, rpc) plus injeksi gangguan (5xx sebelum diproses, respons hilang sesudah diproses, latensi).
+#   python rest_standin.py --port 54321 --db standin.db --seed gulavit_data.json --fail-rate 0.2 --lost-rate 0.1
+# lalu STORAGE_BACKEND=supabase, SUPABASE_URL=http://127.0.0.1:54321, SUPABASE_KEY=<apa saja berbentuk a.b.c>
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from storage import SQLiteBackend, InsufficientStock, _qi, _where
+
+_RESERVED_PARAMS = ("select", "order", "limit", "offset", "columns", "on_conflict", "or")
+_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^,()"]+)|([(),])')
+
+
+def _unquote(s):
+    return re.sub(r"\\(.)", r"\1", s)
+
+
+def _tokens(s):
+    # "nilai dikutip" -> ("str", nilai); kata biasa -> ("word", kata); tanda kurung/koma -> ("sym", c)
+    out = []
+    for quoted, word, sym in _TOKEN.findall(s):
+        if sym:
+            out.append(("sym", sym))
+        elif word:
+            out.append(("word", word))
+        else:
+            out.append(("str", _unquote(quoted)))
+    return out
+
+
+def _value(op, raw):
+    if op == "in":
+        return [_unquote(v[1:-1]) if v.startswith('"') else v
+                for v in re.findall(r'"(?:[^"\\]|\\.)*"|[^,]+', raw.strip("()"))]
+    if op in ("is", "not.is"):
+        return None
+    return raw.replace("*", "%") if op == "ilike" else raw
+
+
+def _split_op(s):
+    # "op.nilai" -> (op, nilai); negasi "not.is.null" -> ("not.is", "null")
+    op, _, rest = s.partition(".")
+    if op == "not":
+        neg, _, rest = rest.partition(".")
+        op = f"not.{neg}"
+    return op, rest
+
+
+def _parse_conds(tokens, i):
+    # Daftar kondisi dipisah koma sampai ')' -> (list filter, posisi berikutnya)
+    conds = []
+    while i < len(tokens) and tokens[i] != ("sym", ")"):
+        kind, text = tokens[i]
+        if kind == "word" and text in ("and", "or") and tokens[i + 1] == ("sym", "("):
+            inner, i = _parse_conds(tokens, i + 2)
+            conds.append((None, "or", [[c] for c in inner]) if text == "or" else (None, "or", [inner]))
+        else:
+            # col.op.nilai: nilai bisa token terpisah (dikutip) atau daftar in.(...)
+            col, _, spec = text.partition(".")
+            op, rest = _split_op(spec)
+            if op == "in":
+                j = i + 2
+                vals = []
+                while tokens[j] != ("sym", ")"):
+                    if tokens[j][0] != "sym":
+                        vals.append(tokens[j][1])
+                    j += 1
+                conds.append((col, "in", vals))
+                i = j
+            elif not rest and i + 1 < len(tokens) and tokens[i + 1][0] == "str":
+                conds.append((col, op, _value(op, tokens[i + 1][1])))
+                i += 1
+            else:
+                conds.append((col, op, _value(op, rest)))
+        i += 1
+        if i < len(tokens) and tokens[i] == ("sym", ","):
+            i += 1
+    return conds, i
+
+
+def parse_filters(params) -> list:
+    # Query string PostgREST -> filter storage (kolom, op, nilai)
+    filters = []
+    for key, val in params:
+        if key == "or":
+            conds, _ = _parse_conds(_tokens(val[1:-1]), 0)
+            filters.append((None, "or", [[c] for c in conds]))
+        elif key not in _RESERVED_PARAMS:
+            op, raw = _split_op(val)
+            filters.append((key, op, _value(op, raw)))
+    return filters
+
+
+class StandIn:
+    def __init__(self, backend, fail_rate=0.0, lost_rate=0.0, latency_ms=0, seed=None):
+        self.backend = backend
+        self.fail_rate = fail_rate
+        self.lost_rate = lost_rate
+        self.latency_ms = latency_ms
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "failed": 0, "lost": 0}
+        self._lock = threading.Lock()
+
+    def roll(self, rate) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def rpc(self, fn, args):
+        b = self.backend
+        if fn == "approve_pending_batch":
+            return b.apply_approval_batch(args.get("p_ops") or [])
+        if fn == "submit_pending_batch":
+            try:
+                return {"rows": b.submit_pending(args.get("p_rows") or [])}
+            except InsufficientStock as e:
+                return {"short": e.shortages}
+        if fn == "reject_pending_batch":
+            return b.reject_pending(args.get("p_ids") or [])
+        if fn == "rebuild_reservations":
+            return b.rebuild_reservations()
+        if fn == "rebuild_history_monthly":
+            return b.rebuild_monthly(brand=args.get("p_brand"))
+        raise KeyError(fn)
+
+    def write(self, method, table, params, body, prefer):
+        conn = self.backend._conn()
+        where, wparams = _where(parse_filters(params))
+        if method == "PATCH":
+            cols = list(body)
+            sql = f"UPDATE {_qi(table)} SET {','.join(f'{_qi(c)} = ?' for c in cols)}{where} RETURNING *"
+            return [dict(r) for r in conn.execute(sql, [body[c] for c in cols] + wparams)]
+        if method == "DELETE":
+            return [dict(r) for r in conn.execute(f"DELETE FROM {_qi(table)}{where} RETURNING *", wparams)]
+        rows = [body] if isinstance(body, dict) else body
+        conflict = dict(params).get("on_conflict")
+        clause = f" ON CONFLICT ({_qi(conflict)}) DO NOTHING" if conflict and "ignore-duplicates" in prefer else ""
+        out = []
+        for row in rows:
+            cols = list(row)
+            sql = (f"INSERT INTO {_qi(table)} ({','.join(_qi(c) for c in cols)}) "
+                   f"VALUES ({','.join('?' * len(cols))}){clause} RETURNING *")
+            out.extend(dict(r) for r in conn.execute(sql, [row[c] for c in cols]))
+        return out
+
+
+def _handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True   # header & body ditulis terpisah: tanpa ini tiap respons +40 ms
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload=None, headers=None):
+            data = b"" if payload is None or self.command == "HEAD" else json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            params = parse_qsl(url.query, keep_blank_values=True)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"null") if length else None
+            with standin._lock:
+                standin.counts["requests"] += 1
+            if standin.latency_ms:
+                time.sleep(standin.latency_ms / 1000)
+            if standin.roll(standin.fail_rate):
+                with standin._lock:
+                    standin.counts["failed"] += 1
+                return self._send(503, {"message": "stand-in: gagal disuntikkan"})
+            path = [p for p in url.path.split("/") if p][2:]   # buang rest/v1
+            try:
+                status, payload, headers = self._dispatch(path, params, body)
+            except Exception as e:
+                return self._send(400, {"message": str(e), "code": type(e).__name__})
+            if standin.roll(standin.lost_rate):
+                # sudah diproses, respons "hilang" di jalan (mis. gateway timeout)
+                with standin._lock:
+                    standin.counts["lost"] += 1
+                return self._send(504, {"message": "stand-in: respons hilang"})
+            self._send(status, payload, headers)
+
+        def _dispatch(self, path, params, body):
+            b = standin.backend
+            prefer = self.headers.get("Prefer") or ""
+            if path[:1] == ["rpc"]:
+                return 200, standin.rpc(path[1], body or {}), {}
+            table = path[0]
+            if self.command in ("GET", "HEAD"):
+                q = dict(params)
+                if "count=" in prefer:
+                    n = b.count(table, parse_filters(params))
+                    return 200, [], {"Content-Range": f"*/{n}"}
+                order = [(o.split(".")[0], ".desc" in o) for o in q["order"].split(",")] if q.get("order") else None
+                rows = b.select(table, columns=q.get("select", "*"), filters=parse_filters(params), order=order,
+                                limit=int(q["limit"]) if q.get("limit") else None)
+                return 200, rows, {"Content-Range": f"0-{max(len(rows) - 1, 0)}/*"}
+            with b.transaction():
+                rows = standin.write(self.command, table, params, body, prefer)
+            return (201 if self.command == "POST" else 200), rows, {}
+
+        do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = _handle
+
+    return Handler
+
+
+def serve(port=54321, db="standin.db", seed_json=None, host="127.0.0.1", **faults):
+    # Return (server, standin); server.serve_forever() di thread pemanggil atau thread sendiri
+    standin = StandIn(SQLiteBackend(db, seed_json=seed_json), **faults)
+    return ThreadingHTTPServer((host, port), _handler(standin)), standin
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Server pengganti Supabase REST (SQLite) dengan injeksi gangguan")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--db", default="standin.db")
+    parser.add_argument("--seed", default=None, help="JSON lama untuk mengisi database baru")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="peluang 503 sebelum request diproses")
+    parser.add_argument("--lost-rate", type=float, default=0.0, help="peluang 504 setelah request diproses")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.db, args.seed, fail_rate=args.fail_rate, lost_rate=args.lost_rate,
+                      latency_ms=args.latency_ms)
+    print(f"Stand-in Supabase REST di http://127.0.0.1:{args.port} ({args.db})")
+    server.serve_forever()
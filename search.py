@@ -0,0 +1,127 @@
+# search.py
+# Indeks pencarian inventory (nama, kode, kategori): teks dinormalisasi + posting trigram, dibangun sekali
+# per versi inventory. Query substring/prefix cukup irisan beberapa posting lalu verifikasi kandidat yang
+# sedikit, bukan str.contains atas seluruh katalog di tiap rerun. Query 1-2 huruf tidak punya trigram:
+# dicocokkan substring langsung (sama seperti str.contains), berhenti begitu limit terpenuhi.
+import re
+import threading
+import unicodedata
+from itertools import islice
+import numpy as np
+import pandas as pd
+
+SEARCH_FIELDS = ("name", "code", "category")
+SCAN_MAX = 2   # term <= 2 huruf dicocokkan substring per baris; >= 3 lewat posting trigram
+VERIFY_MAX = 256   # irisan trigram berhenti saat kandidat <= ini
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def normalize_text(s) -> str:
+    # huruf kecil, tanpa aksen, selain huruf/angka jadi spasi
+    s = unicodedata.normalize("NFKD", str(s)).encode("ascii", "ignore").decode("ascii").lower()
+    return _NON_ALNUM.sub(" ", s).strip()
+
+
+def _trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class InventoryIndex:
+    # Posisi = posisi baris di frame inventory yang diindeks (iloc)
+    def __init__(self, df_inv: pd.DataFrame):
+        n = len(df_inv)
+        cols = {f: (df_inv[f].astype(object).where(df_inv[f].notna(), "").map(normalize_text).tolist()
+                    if f in df_inv.columns else [""] * n) for f in SEARCH_FIELDS}
+        self.names, self.codes = cols["name"], cols["code"]
+        self.text = [" ".join(parts) for parts in zip(*(cols[f] for f in SEARCH_FIELDS))]
+        # urutan default (tanpa query / skor sama): nama barang
+        self.order = np.array(sorted(range(n), key=lambda i: self.names[i]), dtype=np.int64)
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.order] = np.arange(n)
+        self.names_pos = self.order
+        self.names_sorted = np.array([self.names[i] for i in self.order], dtype=object)
+        self.codes_pos = np.array(sorted(range(n), key=self.codes.__getitem__), dtype=np.int64)
+        self.codes_sorted = np.array([self.codes[i] for i in self.codes_pos], dtype=object)
+        grams = {}
+        for pos in self.order.tolist():
+            for g in _trigrams(self.text[pos]):
+                grams.setdefault(g, []).append(pos)
+        # posting tanpa duplikat (set per baris), terurut nama barang -> hasil irisan sudah urut tampil
+        self.grams = {g: np.array(p, dtype=np.int64) for g, p in grams.items()}
+
+    def __len__(self):
+        return len(self.text)
+
+    def _intersect(self, a, b) -> np.ndarray:
+        # Irisan yang mempertahankan urutan a (urut nama), O(len a + len b) lewat mask, tanpa sort
+        mark = np.zeros(len(self.text), dtype=bool)
+        mark[b] = True
+        return a[mark[a]]
+
+    def _candidates(self, term) -> np.ndarray:
+        postings = sorted((self.grams.get(g) for g in _trigrams(term)), key=lambda p: 0 if p is None else len(p))
+        if postings[0] is None:
+            return _EMPTY
+        out = postings[0]
+        for p in postings[1:]:
+            if len(out) <= VERIFY_MAX:
+                break   # kandidat sudah sedikit: sisanya cukup diverifikasi substring
+            out = self._intersect(out, p)
+        return out
+
+    def _field_prefix(self, sorted_vals, sorted_pos, q) -> np.ndarray:
+        # Baris yang field-nya diawali q: satu rentang di array terurut (bisect)
+        lo = np.searchsorted(sorted_vals, q, side="left")
+        hi = np.searchsorted(sorted_vals, q + "\uffff", side="left")
+        return sorted_pos[lo:hi]
+
+    def search(self, query, limit=None) -> np.ndarray:
+        # Return posisi baris terurut relevansi (prefix kode, prefix nama, lalu cocok lain; seri -> urut nama).
+        # Query kosong -> semua, urut nama.
+        q = normalize_text(query)
+        if not q:
+            return self.order if limit is None else self.order[:limit]
+        terms = q.split()
+        cand = self.order   # semua term pendek -> seluruh katalog diverifikasi (urut nama)
+        for i, term in enumerate(t for t in sorted(terms, key=len, reverse=True) if len(t) > SCAN_MAX):
+            c = self._candidates(term)
+            cand = c if i == 0 else self._intersect(cand, c)
+            if not len(cand):
+                return cand
+        # Prefix kode / nama (rentang bisect) pasti cocok & tampil duluan; sisanya kandidat posting (urut nama),
+        # diverifikasi substring satu per satu sampai limit terpenuhi
+        head = np.concatenate([self._field_prefix(self.codes_sorted, self.codes_pos, q),
+                               self._field_prefix(self.names_sorted, self.names_pos, q)])
+        if len(head):
+            head = head[np.sort(np.unique(head, return_index=True)[1])]
+            if limit is not None and len(head) >= limit:
+                return head[:limit]
+            cand = cand[~np.isin(cand, head)]
+        need = len(cand) if limit is None else limit - len(head)
+        text = self.text
+        matches = (p for p in cand.tolist() if all(t in text[p] for t in terms))
+        return np.concatenate([head, np.fromiter(islice(matches, need), dtype=np.int64)])
+
+    def filter(self, df: pd.DataFrame, query) -> pd.DataFrame:
+        # df = frame yang sama dengan yang diindeks (atau turunan dengan urutan baris sama)
+        return df.iloc[self.search(query)] if normalize_text(query) else df
+
+
+_INDEXES = {}   # key -> (tanda pemuatan, frame, InventoryIndex)
+_INDEXES_LOCK = threading.Lock()
+
+
+def inventory_index(df_inv: pd.DataFrame, key=None) -> InventoryIndex:
+    # Satu indeks per key (brand) per proses. Posting berbasis posisi baris -> indeks hanya valid untuk
+    # pemuatan frame yang sama: snapshot mencap loaded_at tiap pemuatan (reload TTL memberi versi sama,
+    # urutan/isi bisa beda); frame tanpa cap dicocokkan lewat identitas objek.
+    stamp = (df_inv.attrs.get("version"), df_inv.attrs.get("loaded_at"))
+    cached = _INDEXES.get(key)
+    if (cached is not None and len(cached[2]) == len(df_inv)
+            and (cached[1] is df_inv or (stamp[1] is not None and cached[0] == stamp))):
+        return cached[2]
+    index = InventoryIndex(df_inv)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = (stamp, df_inv, index)
+    return index
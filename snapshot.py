@@ -0,0 +1,110 @@
+# snapshot.py
+# Snapshot data bersama per proses (inventory, pending, riwayat per brand): semua sesi Streamlit memegang
+# referensi ke frame yang SAMA (tanpa pickle/unpickle seperti st.cache_data). Tiap entri dicap versi tabel
+# dari datacache.versions; writer cukup bump versi, satu thread loader latar belakang memuat ulang.
+# Frame snapshot read-only: pemanggil yang ingin mengubah harus .copy() dulu.
+import threading
+import time
+from datacache import versions as data_versions
+
+REFRESH_INTERVAL = 5   # detik; loader juga dibangunkan langsung oleh bump versi
+
+
+class _Entry:
+    __slots__ = ("version", "loaded_at", "frame")
+
+    def __init__(self, version, loaded_at, frame):
+        self.version = version
+        self.loaded_at = loaded_at
+        self.frame = frame
+
+
+class SharedSnapshots:
+    def __init__(self, versions=data_versions, interval=REFRESH_INTERVAL):
+        self.versions = versions
+        self.interval = interval
+        self._sources = {}   # name -> (table, load(key) -> DataFrame, ttl)
+        self._entries = {}   # (name, key) -> _Entry
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, name, table, load, ttl):
+        # ttl: umur maksimum entri walau versi tidak berubah (menangkap tulisan dari proses lain)
+        with self._lock:
+            self._sources[name] = (table, load, ttl)
+            if self._thread is None:
+                self.versions.subscribe(self._on_bump)
+                self._thread = threading.Thread(target=self._run, name="snapshot-loader", daemon=True)
+                self._thread.start()
+
+    def _key_lock(self, k):
+        with self._lock:
+            return self._key_locks.setdefault(k, threading.Lock())
+
+    def _fresh(self, entry, table, ttl) -> bool:
+        return (entry is not None and entry.version == self.versions.get(table)
+                and time.time() - entry.loaded_at < ttl)
+
+    def _refresh(self, name, key) -> _Entry:
+        # Single-flight: satu pemuatan per (name, key); pemanggil lain menunggu lalu memakai hasilnya
+        table, load, ttl = self._sources[name]
+        with self._key_lock((name, key)):
+            entry = self._entries.get((name, key))
+            if self._fresh(entry, table, ttl):
+                return entry
+            version = self.versions.get(table)   # dibaca sebelum load: bump selama load -> entri tetap basi
+            frame = load(key)
+            loaded_at = time.time()
+            frame.attrs["version"] = version
+            frame.attrs["loaded_at"] = loaded_at   # beda tiap pemuatan, walau versi sama (reload TTL)
+            entry = _Entry(version, loaded_at, frame)
+            self._entries[(name, key)] = entry
+            return entry
+
+    def get(self, name, key=None):
+        # Jalur cepat tanpa lock: versi sama -> referensi frame yang sudah ada (TTL lewat: tetap dipakai,
+        # loader dibangunkan). Versi berubah (mis. tulisan sesi ini) -> tunggu pemuatan, supaya sesi
+        # penulis melihat datanya sendiri.
+        table, _, ttl = self._sources[name]
+        entry = self._entries.get((name, key))
+        if entry is not None and entry.version == self.versions.get(table):
+            if time.time() - entry.loaded_at >= ttl:
+                self._wake.set()
+            return entry.frame
+        return self._refresh(name, key).frame
+
+    def loaded(self) -> dict:
+        # {(name, key): (versi, umur detik, frame)} untuk diagnosis
+        now = time.time()
+        return {k: (e.version, round(now - e.loaded_at, 1), e.frame) for k, e in list(self._entries.items())}
+
+    def _on_bump(self, tables):
+        self._wake.set()
+
+    def _run(self):
+        # Muat ulang entri yang basi sebelum ada sesi yang memintanya (sesi berikutnya dapat jalur cepat)
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            for name, key in list(self._entries):
+                table, _, ttl = self._sources[name]
+                if self._fresh(self._entries.get((name, key)), table, ttl):
+                    continue
+                try:
+                    self._refresh(name, key)
+                except Exception:
+                    pass   # entri lama tetap dipakai; sesi berikutnya mencoba lagi lewat get()
+
+
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def shared_snapshots(backend) -> SharedSnapshots:
+    # Satu layanan snapshot per backend per proses
+    with _SNAPSHOTS_LOCK:
+        if id(backend) not in _SNAPSHOTS:
+            _SNAPSHOTS[id(backend)] = SharedSnapshots()
+        return _SNAPSHOTS[id(backend)]
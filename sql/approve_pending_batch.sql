@@ -0,0 +1,81 @@
+-- approve_pending_batch: dipanggil dari storage.SupabaseBackend.apply_approval_batch
+-- Jalankan sekali di Supabase SQL Editor (setelah sql/history_monthly.sql dan
+-- sql/reservations.sql).
+-- p_ops = [{"pending_id": 1, "code": "ITM-0001", "delta": -5, "release": 5, "history": {...}, "agg": {...}}, ...]
+-- OUT yang membuat stok negatif gagal per baris; "release" melepas reservasi pending OUT.
+-- Semua op diproses berurutan dalam satu transaksi (satu panggilan RPC = satu transaksi).
+-- Return {"applied": [{"index", "stock"}], "failed": [{"index", "reason"}]}
+
+create or replace function approve_pending_batch(p_ops jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  op jsonb;
+  i int := -1;
+  v_code text;
+  v_delta int;
+  v_stock int;
+  v_qty int;
+  v_deleted int;
+  v_hist jsonb;
+  v_cols text;
+  v_applied jsonb := '[]'::jsonb;
+  v_failed jsonb := '[]'::jsonb;
+begin
+  for op in select value from jsonb_array_elements(p_ops) loop
+    i := i + 1;
+    v_code := op->>'code';
+    v_delta := (op->>'delta')::int;
+
+    -- kunci baris inventory; kode tidak ada -> gagal per baris
+    select coalesce(qty, 0) into v_qty from inventory_gulavit where code = v_code for update;
+    if not found then
+      v_failed := v_failed || jsonb_build_object('index', i, 'reason', 'Kode tidak ada di inventory');
+      continue;
+    end if;
+    if v_qty + v_delta < 0 then
+      v_failed := v_failed || jsonb_build_object('index', i, 'reason', format('Stok tidak cukup (sisa %s)', v_qty));
+      continue;
+    end if;
+
+    -- pending yang sudah dihapus admin lain tidak boleh diterapkan dua kali
+    if op->>'pending_id' is not null then
+      delete from pending_gulavit where id = (op->>'pending_id')::bigint;
+      get diagnostics v_deleted = row_count;
+      if v_deleted = 0 then
+        v_failed := v_failed || jsonb_build_object('index', i, 'reason', 'Request sudah diproses');
+        continue;
+      end if;
+    end if;
+
+    update inventory_gulavit
+       set qty = coalesce(qty, 0) + v_delta,
+           balance = coalesce(qty, 0) + v_delta,
+           reserved = greatest(coalesce(reserved, 0) - coalesce((op->>'release')::int, 0), 0)
+     where code = v_code
+    returning qty into v_stock;
+
+    v_hist := (op->'history') || jsonb_build_object('stock', v_stock);
+    select string_agg(quote_ident(k), ',') into v_cols from jsonb_object_keys(v_hist) k;
+    execute format(
+      'insert into history_gulavit (%s) select %s from jsonb_populate_record(null::history_gulavit, $1)',
+      v_cols, v_cols
+    ) using v_hist;
+
+    -- agregat bulanan (dashboard) ikut transaksi yang sama
+    if op->'agg' is not null and jsonb_typeof(op->'agg') = 'object' then
+      insert into history_monthly_gulavit as m (month, type_norm, event, trans_type, code, brand, qty)
+      values ((op->'agg'->>'month')::date, op->'agg'->>'type_norm', op->'agg'->>'event',
+              op->'agg'->>'trans_type', op->'agg'->>'code', coalesce(op->'agg'->>'brand', ''),
+              (op->'agg'->>'qty')::int)
+      on conflict (month, type_norm, event, trans_type, code, brand)
+      do update set qty = m.qty + excluded.qty;
+    end if;
+
+    v_applied := v_applied || jsonb_build_object('index', i, 'stock', v_stock);
+  end loop;
+
+  return jsonb_build_object('applied', v_applied, 'failed', v_failed);
+end;
+$$;
@@ -0,0 +1,35 @@
+-- Agregat bulanan riwayat APPROVE_* untuk Dashboard (storage.MONTHLY_TABLE)
+-- Diisi bertahap oleh approve_pending_batch; backfill: select rebuild_history_monthly(null);
+-- atau `python storage.py rebuild-monthly`.
+create table if not exists history_monthly_gulavit (
+  month date not null,
+  type_norm text not null,
+  event text not null,
+  trans_type text not null,
+  code text not null,
+  brand text not null default '',
+  qty bigint not null default 0,
+  primary key (month, type_norm, event, trans_type, code, brand)
+);
+
+create or replace function rebuild_history_monthly(p_brand text default null)
+returns void
+language plpgsql
+as $$
+begin
+  delete from history_monthly_gulavit where p_brand is null or brand = p_brand;
+  insert into history_monthly_gulavit (month, type_norm, event, trans_type, code, brand, qty)
+  select date_trunc('month', coalesce(nullif(h.date::text, ''), h.timestamp::text)::date)::date,
+         substr(h.action, 9),
+         coalesce(nullif(h.event, ''), '-'),
+         coalesce(nullif(h.trans_type, ''), '-'),
+         coalesce(h.code, '-'),
+         coalesce(to_jsonb(h)->>'brand', ''),
+         sum(h.qty)
+  from history_gulavit h
+  where h.action in ('APPROVE_IN', 'APPROVE_OUT', 'APPROVE_RETURN')
+    and coalesce(nullif(h.date::text, ''), h.timestamp::text) is not null
+    and (p_brand is null or to_jsonb(h)->>'brand' = p_brand)
+  group by 1, 2, 3, 4, 5, 6;
+end;
+$$;
@@ -0,0 +1,4 @@
+-- Index untuk tabel riwayat berhalaman (history.fetch_history_page): keyset (sort_key, id)
+-- dan count per filter tanpa full scan. Jalankan sekali di Supabase SQL Editor.
+create index if not exists idx_history_timestamp on history_gulavit (timestamp, id);
+create index if not exists idx_history_action on history_gulavit (action, id);
@@ -0,0 +1,5 @@
+-- batch_id: satu pengajuan (keranjang IN/OUT/Retur) = satu batch, di-approve/reject sebagai satu unit.
+-- Jalankan sekali di Supabase SQL Editor. Kolom di riwayat supaya jejak batch ikut tersimpan.
+alter table pending_gulavit add column if not exists batch_id text;
+alter table history_gulavit add column if not exists batch_id text;
+create index if not exists idx_pending_batch on pending_gulavit (batch_id);
@@ -0,0 +1,6 @@
+-- request_key: kunci idempoten per baris riwayat (uuid dari storage.SupabaseBackend.insert).
+-- Insert yang dikirim ulang setelah respons hilang (timeout / 5xx) memakai on_conflict=request_key
+-- dengan ignore-duplicates, jadi baris riwayat tidak dobel. Jalankan sekali di Supabase SQL Editor.
+-- Baris lama (NULL) tidak bentrok: NULL tidak dianggap sama oleh unique index.
+alter table history_gulavit add column if not exists request_key text;
+create unique index if not exists idx_history_request_key on history_gulavit (request_key);
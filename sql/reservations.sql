@@ -0,0 +1,97 @@
+-- Reservasi stok untuk pending OUT: inventory_gulavit.reserved = SUM(qty pending OUT) per kode.
+-- Stok tersedia = qty - reserved. Dipakai storage.SupabaseBackend.submit_pending / reject_pending.
+-- Jalankan sekali di Supabase SQL Editor, sebelum sql/approve_pending_batch.sql.
+alter table inventory_gulavit add column if not exists reserved bigint not null default 0;
+
+create or replace function rebuild_reservations()
+returns void
+language sql
+as $$
+  update inventory_gulavit i
+     set reserved = coalesce((select sum(p.qty) from pending_gulavit p
+                              where p.code = i.code and upper(p.type) = 'OUT'), 0);
+$$;
+
+-- p_rows = baris pending lengkap (type, code, qty, ...). Return {"rows": [...]} atau {"short": {code: tersedia}}
+-- tanpa menulis apa pun jika ada kode yang kurang.
+-- Idempoten per batch_id: batch yang sudah tersimpan (panggilan dikirim ulang) -> baris lama, tanpa cadangan dobel.
+create or replace function submit_pending_batch(p_rows jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  r record;
+  v_short jsonb := '{}'::jsonb;
+  v_cols text;
+  v_rows jsonb;
+  v_batch text := p_rows->0->>'batch_id';
+begin
+  if v_batch is not null then
+    perform pg_advisory_xact_lock(hashtext(v_batch));
+    select jsonb_agg(to_jsonb(p)) into v_rows from pending_gulavit p where p.batch_id = v_batch;
+    if v_rows is not null then
+      return jsonb_build_object('rows', v_rows);
+    end if;
+  end if;
+
+  -- kunci baris inventory yang dicadangkan (urut kode supaya tidak deadlock antar sesi)
+  perform 1 from inventory_gulavit
+   where code in (select e->>'code' from jsonb_array_elements(p_rows) e where upper(e->>'type') = 'OUT')
+   order by code
+     for update;
+
+  for r in
+    select n.code, n.need, coalesce(i.qty, 0) - coalesce(i.reserved, 0) as avail
+      from (select e->>'code' as code, sum((e->>'qty')::int) as need
+              from jsonb_array_elements(p_rows) e
+             where upper(e->>'type') = 'OUT'
+             group by e->>'code') n
+      left join inventory_gulavit i on i.code = n.code
+  loop
+    if r.avail is null or r.need > r.avail then
+      v_short := v_short || jsonb_build_object(r.code, greatest(coalesce(r.avail, 0), 0));
+    end if;
+  end loop;
+  if v_short <> '{}'::jsonb then
+    return jsonb_build_object('short', v_short);
+  end if;
+
+  update inventory_gulavit i
+     set reserved = coalesce(i.reserved, 0) + n.need
+    from (select e->>'code' as code, sum((e->>'qty')::int) as need
+            from jsonb_array_elements(p_rows) e
+           where upper(e->>'type') = 'OUT'
+           group by e->>'code') n
+   where i.code = n.code;
+
+  select string_agg(distinct quote_ident(k), ',') into v_cols
+    from jsonb_array_elements(p_rows) e, jsonb_object_keys(e) k;
+  execute format(
+    'with ins as (insert into pending_gulavit (%s) select %s from jsonb_populate_recordset(null::pending_gulavit, $1) returning *)
+     select coalesce(jsonb_agg(to_jsonb(ins)), ''[]''::jsonb) from ins',
+    v_cols, v_cols
+  ) into v_rows using p_rows;
+  return jsonb_build_object('rows', v_rows);
+end;
+$$;
+
+-- Hapus pending + lepas reservasinya; return baris yang benar-benar terhapus (yang sudah diproses admin lain tidak)
+create or replace function reject_pending_batch(p_ids bigint[])
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_deleted jsonb;
+begin
+  with del as (
+    delete from pending_gulavit where id = any(p_ids) returning *
+  ), rel as (
+    update inventory_gulavit i
+       set reserved = greatest(coalesce(i.reserved, 0) - d.qty, 0)
+      from (select code, sum(qty) as qty from del where upper(type) = 'OUT' group by code) d
+     where i.code = d.code
+  )
+  select coalesce(jsonb_agg(to_jsonb(del)), '[]'::jsonb) into v_deleted from del;
+  return v_deleted;
+end;
+$$;
@@ -0,0 +1,33 @@
+# startup.py
+# Waktu startup per proses: import modul berat & first paint (halaman login / halaman utama).
+# Nilai run pertama = cold start container; run berikutnya = biaya rerun biasa. Ditampilkan di sidebar admin
+# (timings.report()), tidak ditulis ke stdout.
+import threading
+import time
+
+
+class StartupTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}   # tahap -> {"first": ms, "last": ms, "runs": n}
+
+    def record(self, phase, since) -> float:
+        # since = time.perf_counter() saat tahap dimulai
+        ms = (time.perf_counter() - since) * 1000
+        with self._lock:
+            entry = self._phases.get(phase)
+            if entry is None:
+                self._phases[phase] = {"first": ms, "last": ms, "runs": 1}
+            else:
+                entry["last"] = ms
+                entry["runs"] += 1
+        return ms
+
+    def report(self) -> list:
+        with self._lock:
+            return [{"Tahap": phase, "Cold start (ms)": round(e["first"], 1), "Terakhir (ms)": round(e["last"], 1),
+                     "Run": e["runs"]} for phase, e in self._phases.items()]
+
+
+# Modul ini di-import sekali per proses: satu catatan untuk semua sesi
+timings = StartupTimings()
@@ -0,0 +1,136 @@
+# stock_card.py
+# Stock card per kode barang, tervektorisasi: tanda +/- per action, saldo berjalan via cumsum,
+# keterangan dirakit dengan operasi string per kolom (tanpa iterrows).
+import numpy as np
+import pandas as pd
+
+# Hanya action yang mengubah stok
+STOCK_CARD_SIGN = {"ADD_ITEM": 1, "APPROVE_IN": 1, "APPROVE_OUT": -1, "APPROVE_RETURN": 1}
+
+STOCK_CARD_COLS = ["Tanggal", "Keterangan", "Masuk (IN)", "Keluar (OUT)", "Saldo Akhir"]
+# Kolom riwayat yang dibaca stock card (dipakai sebagai select saat memuat riwayat)
+STOCK_CARD_HIST_COLS = ("id", "timestamp", "date", "action", "code", "item", "qty", "user", "event", "trans_type",
+                        "do_number")
+
+
+class MovementIndex:
+    # kode barang -> posisi baris (terurut) di frame riwayat; baris lama tanpa kode diindeks per nama.
+    # Frame riwayat append-only & urut (timestamp, id), jadi posisi baru selalu di belakang.
+    def __init__(self):
+        self.by_code = {}
+        self.by_name = {}
+        self.size = 0
+
+    @staticmethod
+    def _add(target, keys, positions):
+        if not len(positions):
+            return
+        groups = pd.Series(positions).groupby(keys).indices
+        for k, idx in groups.items():
+            arr = positions[idx]
+            target[k] = np.concatenate([target[k], arr]) if k in target else arr
+
+    def extend(self, new_rows: pd.DataFrame):
+        # Dipanggil dengan baris yang baru di-append ke frame
+        n = len(new_rows)
+        if not n:
+            return
+        pos = np.arange(self.size, self.size + n, dtype=np.int64)
+        code = _col(new_rows, "code", None)
+        has_code = (code.notna() & ~code.isin(["", "-"])).to_numpy()
+        self._add(self.by_code, code.to_numpy()[has_code], pos[has_code])
+        item = _col(new_rows, "item", None)
+        by_name = ~has_code & item.notna().to_numpy()
+        self._add(self.by_name, item.to_numpy()[by_name], pos[by_name])
+        self.size += n
+
+    def lookup(self, code, names=()) -> np.ndarray:
+        parts = [self.by_code.get(code)] + [self.by_name.get(n) for n in names]
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+
+def _col(df, name, fill="-"):
+    if name not in df.columns:
+        return pd.Series(fill, index=df.index, dtype=object)
+    return df[name].astype(object).where(df[name].notna(), fill)
+
+
+def resolve_codes(df_hist: pd.DataFrame, name_to_code=None) -> pd.Series:
+    # Kode per baris riwayat; baris lama tanpa 'code' (mis. ADD_ITEM lama) dipetakan dari nama barang
+    code = _col(df_hist, "code", None)
+    if name_to_code:
+        missing = code.isna() | code.isin(["", "-"])
+        if missing.any():
+            code = code.where(~missing, _col(df_hist, "item", None).map(name_to_code))
+    return code
+
+
+def item_movements(df_hist: pd.DataFrame, code, name_to_code=None) -> pd.DataFrame:
+    # Baris riwayat yang mengubah stok untuk satu kode, urut (timestamp, id), plus kolom delta & tanggal efektif
+    if df_hist.empty:
+        return pd.DataFrame()
+    act = _col(df_hist, "action", "").astype(str)
+    mask = act.isin(list(STOCK_CARD_SIGN)) & (resolve_codes(df_hist, name_to_code) == code)
+    mv = df_hist.loc[mask].copy()
+    if mv.empty:
+        return mv
+    mv["action"] = act[mask]
+    qty = pd.to_numeric(mv["qty"], errors="coerce").fillna(0).astype(np.int64)
+    mv["qty"] = qty
+    mv["delta"] = qty * mv["action"].map(STOCK_CARD_SIGN).astype(np.int64)
+    if "date_eff" not in mv.columns:   # riwayat dari history.normalize_history sudah membawa date_eff
+        date_s = pd.to_datetime(_col(mv, "date", None), errors="coerce")
+        ts_s = pd.to_datetime(_col(mv, "timestamp", None), errors="coerce")
+        mv["date_eff"] = date_s.fillna(ts_s).dt.floor("D")
+    sort_cols = [c for c in ("timestamp", "id") if c in mv.columns]
+    return mv.sort_values(sort_cols, kind="mergesort") if sort_cols else mv
+
+
+def build_stock_card(df_hist: pd.DataFrame, code, name_to_code=None, start_date=None, positions=None) -> pd.DataFrame:
+    # positions (dari MovementIndex.lookup) membatasi scan ke baris milik barang ini saja
+    if positions is not None:
+        df_hist = df_hist.iloc[positions[positions < len(df_hist)]]
+    mv = item_movements(df_hist, code, name_to_code)
+    if mv.empty:
+        return pd.DataFrame(columns=STOCK_CARD_COLS)
+
+    opening = 0
+    if start_date is not None:
+        before = mv["date_eff"] < pd.Timestamp(start_date)
+        opening = int(mv.loc[before, "delta"].sum())
+        mv = mv.loc[~before]
+
+    act = mv["action"]
+    user = _col(mv, "user").astype(str)
+    event = _col(mv, "event").astype(str)
+    tipe = _col(mv, "trans_type").astype(str)
+    do_num = _col(mv, "do_number").astype(str)
+
+    ket = pd.Series("N/A", index=mv.index, dtype=object)
+    ket[act == "ADD_ITEM"] = "Initial Stock"
+    is_in = act == "APPROVE_IN"
+    do_suffix = (" (No. DO: " + do_num + ")").where(do_num != "-", "")
+    ket[is_in] = "Request IN by " + user[is_in] + do_suffix[is_in]
+    is_out = act == "APPROVE_OUT"
+    ket[is_out] = "Request OUT (" + tipe[is_out] + ") by " + user[is_out] + " for event: " + event[is_out]
+    is_ret = act == "APPROVE_RETURN"
+    ket[is_ret] = "Retur by " + user[is_ret] + " for event: " + event[is_ret]
+
+    qty_in = mv["qty"].where(mv["delta"] > 0, 0)
+    qty_out = mv["qty"].where(mv["delta"] < 0, 0)
+    tanggal = _col(mv, "date", None)
+    card = pd.DataFrame({
+        "Tanggal": tanggal.where(tanggal.notna(), _col(mv, "timestamp", None)),
+        "Keterangan": ket,
+        "Masuk (IN)": qty_in.astype(object).where(qty_in > 0, "-"),
+        "Keluar (OUT)": qty_out.astype(object).where(qty_out > 0, "-"),
+        "Saldo Akhir": opening + mv["delta"].cumsum(),
+    })
+    if start_date is not None:
+        head = pd.DataFrame([{"Tanggal": pd.Timestamp(start_date).strftime("%Y-%m-%d"), "Keterangan": "Saldo Awal",
+                              "Masuk (IN)": "-", "Keluar (OUT)": "-", "Saldo Akhir": opening}])
+        card = pd.concat([head, card], ignore_index=True)
+    return card.reset_index(drop=True)
@@ -0,0 +1,634 @@
+# storage.py
+# Lapisan penyimpanan untuk app.py: semua load_*/inv_*/pending_*/history_* lewat sini.
+# Backend: Supabase (default, via HTTP) atau SQLite lokal (kantor cabang / load test tanpa jaringan).
+import os
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+USERS_TABLE = "users_gulavit"
+INVENTORY_TABLE = "inventory_gulavit"
+PENDING_TABLE = "pending_gulavit"
+HISTORY_TABLE = "history_gulavit"
+# Agregat bulanan riwayat APPROVE_*: (month, type_norm, event, trans_type, code, brand) -> qty
+MONTHLY_TABLE = "history_monthly_gulavit"
+MONTHLY_KEY = ("month", "type_norm", "event", "trans_type", "code", "brand")
+
+# Filter = list of (kolom, op, nilai); op mengikuti nama filter PostgREST.
+# "is" / "not.is" hanya untuk nilai None (IS NULL / IS NOT NULL); "ilike" memakai pola % / _.
+# Grup OR: (None, "or", [[filter, ...], [filter, ...]]) -> (grup1) OR (grup2), isi grup di-AND.
+FILTER_OPS = ("eq", "neq", "gt", "gte", "lt", "lte", "in", "is", "not.is", "ilike", "or")
+
+# Insert yang aman dikirim ulang: tabel -> kolom kunci unik (diisi uuid per baris bila belum ada)
+IDEMPOTENT_INSERTS = {HISTORY_TABLE: "request_key"}
+
+
+def _keyset_filter(key, after, desc=False):
+    # (k1, k2) > (v1, v2)  ->  k1 > v1 OR (k1 = v1 AND k2 > v2); desc: < (halaman urut turun)
+    # key satu kolom (mis. ("id",)) -> k1 > v1
+    if after is None:
+        return []
+    if any(v is None for v in after):
+        raise ValueError("Cursor keyset tidak boleh berisi NULL (pisahkan baris NULL dengan filter is / not.is)")
+    op = "lt" if desc else "gt"
+    if len(key) == 1:
+        return [(key[0], op, after[0])]
+    (k1, k2), (v1, v2) = key, after
+    return [(None, "or", [[(k1, op, v1)], [(k1, "eq", v1), (k2, op, v2)]])]
+
+
+class InsufficientStock(ValueError):
+    # Pengajuan OUT melebihi stok tersedia (qty - reserved); shortages = {code: tersedia}
+    def __init__(self, shortages):
+        self.shortages = dict(shortages)
+        super().__init__(", ".join(f"{c}: tersedia {a}" for c, a in self.shortages.items()))
+
+
+def reservation_need(rows) -> dict:
+    # Total qty pending OUT per kode (yang dicadangkan dari stok)
+    need = {}
+    for r in rows:
+        if str(r.get("type") or "").upper() == "OUT" and r.get("code"):
+            need[r["code"]] = need.get(r["code"], 0) + int(r.get("qty") or 0)
+    return need
+
+
+class StorageBackend:
+    name = "base"
+
+    def select(self, table, columns="*", filters=None, order=None, limit=None) -> list:
+        raise NotImplementedError
+
+    def insert(self, table, rows) -> list:
+        raise NotImplementedError
+
+    def update(self, table, values: dict, filters) -> None:
+        raise NotImplementedError
+
+    def delete(self, table, filters) -> None:
+        raise NotImplementedError
+
+    def rebuild_monthly(self, brand=None) -> None:
+        # Hitung ulang MONTHLY_TABLE dari seluruh riwayat (backfill); brand None = semua
+        raise NotImplementedError
+
+    def select_after(self, table, key, after=None, columns="*", filters=None, limit=1000, desc=False) -> list:
+        # Keyset pagination: baris dengan (key[0], key[1]) > after (atau key[0] > after untuk key satu kolom),
+        # urut naik, maksimal `limit`
+        # (desc=True: < after, urut turun). Kolom key tidak boleh NULL: baris NULL disaring dengan not.is
+        # dan dipaging terpisah (lihat history.fetch_history_page).
+        raise NotImplementedError
+
+    def count(self, table, filters=None) -> int:
+        raise NotImplementedError
+
+    def apply_approval_batch(self, ops) -> dict:
+        # ops: list of {"pending_id", "code", "delta", "release", "history"} (lihat approvals.py), diproses
+        # berurutan dalam SATU transaksi. OUT yang membuat stok negatif gagal per baris; "release" mengurangi
+        # inventory.reserved. Return {"applied": [{"index", "stock"}], "failed": [{"index", "reason"}]}
+        raise NotImplementedError
+
+    # --- reservasi stok untuk pending OUT: inventory.reserved = SUM(qty pending OUT) per kode ---
+    def submit_pending(self, rows) -> list:
+        # Insert pending + tambah reserved dalam satu transaksi; InsufficientStock jika qty - reserved kurang
+        raise NotImplementedError
+
+    def reject_pending(self, ids) -> list:
+        # Hapus pending id IN ids + lepas reservasinya; return baris yang benar-benar terhapus
+        raise NotImplementedError
+
+    def rebuild_reservations(self) -> None:
+        # Hitung ulang reserved dari pending_gulavit (backfill / setelah reset)
+        raise NotImplementedError
+
+
+# ================== SUPABASE ==================
+def _pgrst_value(v):
+    # nilai di dalam or=(...) PostgREST: dikutip supaya koma/titik/kurung aman.
+    # None tidak punya bentuk teks (bukan "None"): pakai op is / not.is
+    if v is None:
+        raise ValueError("Nilai filter None hanya untuk op is / not.is")
+    return '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _pgrst_cond(col, op, val):
+    if op == "in":
+        return f"{col}.in.({','.join(_pgrst_value(v) for v in val)})"
+    if op == "is":
+        return f"{col}.is.null"
+    if op == "not.is":
+        return f"{col}.not.is.null"
+    if op == "or":
+        return "or(" + ",".join(_pgrst_group(g) for g in val) + ")"
+    return f"{col}.{op}.{_pgrst_value(val)}"
+
+
+def _pgrst_group(group):
+    conds = [_pgrst_cond(*f) for f in group]
+    return conds[0] if len(conds) == 1 else "and(" + ",".join(conds) + ")"
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, url, key, timeout=None, retries=None):
+        # Satu httpx.Client (pool koneksi + retry/backoff + statistik, lihat transport.py) per backend
+        from supabase import create_client, ClientOptions
+        from transport import RetryPolicy, TIMEOUTS, resilient_http_client
+        timeouts = {k: float(timeout) for k in TIMEOUTS} if timeout else None
+        policy = RetryPolicy(retries=int(retries)) if retries is not None else None
+        self.http = resilient_http_client(policy=policy, timeouts=timeouts)
+        self.client = create_client(url, key, options=ClientOptions(httpx_client=self.http))
+
+    def http_stats(self) -> list:
+        return self.http.transport_stats.report()
+
+    @staticmethod
+    def _execute(q, idempotency_key=None):
+        # Retry bawaan postgrest (GET/HEAD 503/520, jeda 1-30 detik) dimatikan: retry di transport.py.
+        # idempotency_key -> transport boleh mengulang request walau gagal setelah terkirim.
+        if idempotency_key:
+            from transport import IDEMPOTENCY_HEADER
+            q.request.headers[IDEMPOTENCY_HEADER] = str(idempotency_key)
+        return q.retry(False).execute()
+
+    @staticmethod
+    def _apply_filters(q, filters):
+        or_filters = []
+        for col, op, val in filters or []:
+            if op not in FILTER_OPS:
+                raise ValueError(f"Filter tidak dikenal: {op}")
+            if op == "in":
+                q = q.in_(col, list(val))
+            elif op == "is":
+                q = q.is_(col, "null")
+            elif op == "not.is":
+                q = q.not_.is_(col, "null")
+            elif op == "or":
+                or_filters.append(val)
+            else:
+                q = getattr(q, op)(col, val)
+        # PostgREST hanya menerima satu parameter or=; beberapa grup OR digabung lewat and(...)
+        if len(or_filters) == 1:
+            q = q.or_(",".join(_pgrst_group(g) for g in or_filters[0]))
+        elif or_filters:
+            q = q.or_("and(" + ",".join(_pgrst_cond(None, "or", g) for g in or_filters) + ")")
+        return q
+
+    def select(self, table, columns="*", filters=None, order=None, limit=None) -> list:
+        cols = columns if isinstance(columns, str) else ",".join(columns)
+        q = self._apply_filters(self.client.from_(table).select(cols), filters)
+        for col, desc in order or []:
+            q = q.order(col, desc=desc)
+        if limit is not None:
+            q = q.limit(int(limit))
+        return self._execute(q).data or []
+
+    def select_after(self, table, key, after=None, columns="*", filters=None, limit=1000, desc=False) -> list:
+        cols = columns if isinstance(columns, str) else ",".join(columns)
+        q = self._apply_filters(self.client.from_(table).select(cols),
+                                list(filters or []) + _keyset_filter(key, after, desc))
+        for k in key:
+            q = q.order(k, desc=desc)
+        return self._execute(q.limit(int(limit))).data or []
+
+    def count(self, table, filters=None) -> int:
+        # HEAD request dengan Prefer: count=exact -> tidak ada baris yang ditransfer
+        q = self._apply_filters(self.client.from_(table).select("id", count="exact", head=True), filters)
+        return int(self._execute(q).count or 0)
+
+    def insert(self, table, rows) -> list:
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+        conflict = IDEMPOTENT_INSERTS.get(table)
+        if conflict is None:
+            return self._execute(self.client.from_(table).insert(rows)).data or []
+        # Kirim ulang setelah respons hilang -> baris ber-kunci sama dilewati server (tidak dobel)
+        rows = [{**r, conflict: r.get(conflict) or uuid.uuid4().hex} for r in rows]
+        q = self.client.from_(table).upsert(rows, on_conflict=conflict, ignore_duplicates=True)
+        return self._execute(q, idempotency_key=rows[0][conflict]).data or []
+
+    def update(self, table, values: dict, filters) -> None:
+        # Nilai absolut (bukan increment): mengulang update hasilnya sama
+        self._execute(self._apply_filters(self.client.from_(table).update(values), filters),
+                      idempotency_key=uuid.uuid4().hex)
+
+    def delete(self, table, filters) -> None:
+        self._execute(self._apply_filters(self.client.from_(table).delete(), filters),
+                      idempotency_key=uuid.uuid4().hex)
+
+    def apply_approval_batch(self, ops) -> dict:
+        # Satu round trip: fungsi Postgres di sql/approve_pending_batch.sql (seluruh batch satu transaksi).
+        # Tanpa idempotency key: dikirim ulang hanya bila gagal sebelum terkirim.
+        payload = [{"pending_id": op["pending_id"], "code": op["code"], "delta": op["delta"],
+                    "release": op.get("release", 0), "history": op["history"], "agg": op.get("agg")}
+                   for op in ops]
+        return self._execute(self.client.rpc("approve_pending_batch", {"p_ops": payload})).data or {}
+
+    def submit_pending(self, rows) -> list:
+        # sql/reservations.sql: cek & cadangkan stok + insert dalam satu transaksi.
+        # batch_id yang sudah tersimpan tidak di-insert lagi -> aman dikirim ulang.
+        rows = list(rows)
+        batch_id = rows[0].get("batch_id") if rows else None
+        q = self.client.rpc("submit_pending_batch", {"p_rows": rows})
+        res = self._execute(q, idempotency_key=batch_id).data or {}
+        if res.get("short"):
+            raise InsufficientStock(res["short"])
+        return res.get("rows") or []
+
+    def reject_pending(self, ids) -> list:
+        q = self.client.rpc("reject_pending_batch", {"p_ids": [int(i) for i in ids]})
+        return self._execute(q).data or []
+
+    def rebuild_reservations(self) -> None:
+        self._execute(self.client.rpc("rebuild_reservations", {}), idempotency_key=uuid.uuid4().hex)
+
+    def rebuild_monthly(self, brand=None) -> None:
+        self._execute(self.client.rpc("rebuild_history_monthly", {"p_brand": brand}), idempotency_key=uuid.uuid4().hex)
+
+
+# ================== SQLITE (lokal) ==================
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {USERS_TABLE} (
+    username TEXT PRIMARY KEY, password TEXT, role TEXT
+);
+CREATE TABLE IF NOT EXISTS {INVENTORY_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT NOT NULL UNIQUE, item TEXT, qty INTEGER DEFAULT 0, balance INTEGER DEFAULT 0,
+    unit TEXT, category TEXT, brand TEXT, reserved INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS {PENDING_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT, date TEXT, code TEXT, item TEXT, qty INTEGER, unit TEXT, event TEXT, trans_type TEXT,
+    do_number TEXT, attachment TEXT, "user" TEXT, timestamp TEXT, brand TEXT, batch_id TEXT
+);
+CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT, item TEXT, qty INTEGER, stock, unit TEXT, "user" TEXT, event TEXT, do_number TEXT,
+    attachment TEXT, timestamp TEXT, date TEXT, code TEXT, trans_type TEXT, brand TEXT, batch_id TEXT,
+    request_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pending_code ON {PENDING_TABLE}(code);
+CREATE INDEX IF NOT EXISTS idx_history_code ON {HISTORY_TABLE}(code);
+CREATE INDEX IF NOT EXISTS idx_history_item ON {HISTORY_TABLE}(item);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON {HISTORY_TABLE}(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_history_action ON {HISTORY_TABLE}(action, id);
+CREATE TABLE IF NOT EXISTS {MONTHLY_TABLE} (
+    month TEXT NOT NULL, type_norm TEXT NOT NULL, event TEXT NOT NULL, trans_type TEXT NOT NULL,
+    code TEXT NOT NULL, brand TEXT NOT NULL DEFAULT '', qty INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, type_norm, event, trans_type, code, brand)
+);
+"""
+
+# Bulan efektif = date, fallback timestamp (sama dengan date_eff di history.prepare_history_df)
+SQLITE_MONTHLY_REBUILD = f"""
+INSERT INTO {MONTHLY_TABLE} (month, type_norm, event, trans_type, code, brand, qty)
+SELECT substr(coalesce(nullif(date, ''), timestamp), 1, 7) || '-01' AS month,
+       substr(action, 9) AS type_norm,
+       coalesce(nullif(event, ''), '-'), coalesce(nullif(trans_type, ''), '-'), coalesce(code, '-'), coalesce(brand, ''),
+       sum(qty)
+FROM {HISTORY_TABLE}
+WHERE action IN ('APPROVE_IN', 'APPROVE_OUT', 'APPROVE_RETURN')
+  AND coalesce(nullif(date, ''), timestamp) IS NOT NULL {{brand_clause}}
+GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+SQLITE_RESERVATION_REBUILD = f"""
+UPDATE {INVENTORY_TABLE} SET reserved = COALESCE((
+    SELECT SUM(p.qty) FROM {PENDING_TABLE} p WHERE p.code = {INVENTORY_TABLE}.code AND UPPER(p.type) = 'OUT'
+), 0)
+"""
+
+_SQL_OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _qi(name):
+    # quote identifier ("user" adalah keyword SQL)
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_cols(columns):
+    if isinstance(columns, str):
+        return "*" if columns.strip() == "*" else ",".join(_qi(c.strip()) for c in columns.split(","))
+    return ",".join(_qi(c) for c in columns)
+
+
+def _where(filters):
+    clause, params = _sql_and(filters)
+    return (" WHERE " + clause if clause else ""), params
+
+
+def _sql_and(filters):
+    clauses, params = [], []
+    for col, op, val in filters or []:
+        if op == "or":
+            parts = []
+            for group in val:
+                c, p = _sql_and(group)
+                parts.append(f"({c or '1'})")
+                params.extend(p)
+            clauses.append("(" + " OR ".join(parts or ["0"]) + ")")
+        elif op == "is":
+            clauses.append(f"{_qi(col)} IS NULL")
+        elif op == "not.is":
+            clauses.append(f"{_qi(col)} IS NOT NULL")
+        elif op == "ilike":
+            clauses.append(f"{_qi(col)} LIKE ? ESCAPE '\\'")
+            params.append(val)
+        elif op == "in":
+            vals = list(val)
+            if not vals:
+                clauses.append("0")
+                continue
+            clauses.append(f"{_qi(col)} IN ({','.join('?' * len(vals))})")
+            params.extend(vals)
+        elif op in _SQL_OPS:
+            clauses.append(f"{_qi(col)} {_SQL_OPS[op]} ?")
+            params.append(val)
+        else:
+            raise ValueError(f"Filter tidak dikenal: {op}")
+    return " AND ".join(clauses), params
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path="inventory.db", seed_json=None):
+        self.path = path
+        self._local = threading.local()
+        is_new = not os.path.exists(path)
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        self._migrate(conn)
+        if is_new and seed_json and os.path.exists(seed_json):
+            self.seed_from_json(seed_json)
+
+    # Kolom yang ditambahkan setelah database lama dibuat: (tabel, kolom, definisi)
+    _ADDED_COLUMNS = [
+        (INVENTORY_TABLE, "reserved", "INTEGER NOT NULL DEFAULT 0"),
+        (PENDING_TABLE, "batch_id", "TEXT"),
+        (HISTORY_TABLE, "batch_id", "TEXT"),
+        (HISTORY_TABLE, "request_key", "TEXT"),
+    ]
+
+    @classmethod
+    def _migrate(cls, conn):
+        for table, col, ddl in cls._ADDED_COLUMNS:
+            cols = {r["name"] for r in conn.execute(f"PRAGMA table_info({_qi(table)})")}
+            if col not in cols:
+                conn.execute(f"ALTER TABLE {_qi(table)} ADD COLUMN {col} {ddl}")
+                if col == "reserved":   # pending OUT yang sudah ada ikut dicadangkan
+                    conn.execute(SQLITE_RESERVATION_REBUILD)
+        # index kolom baru dibuat di sini (SQLITE_SCHEMA jalan sebelum kolomnya ada di database lama)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_pending_batch ON {_qi(PENDING_TABLE)}(batch_id)")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_history_request_key ON {_qi(HISTORY_TABLE)}(request_key)")
+
+    def _conn(self):
+        # Satu koneksi per thread (tiap sesi Streamlit jalan di thread sendiri)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def select(self, table, columns="*", filters=None, order=None, limit=None) -> list:
+        cols = _sql_cols(columns)
+        where, params = _where(filters)
+        sql = f"SELECT {cols} FROM {_qi(table)}{where}"
+        if order:
+            sql += " ORDER BY " + ",".join(f"{_qi(c)} {'DESC' if desc else 'ASC'}" for c, desc in order)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(r) for r in self._conn().execute(sql, params).fetchall()]
+
+    def select_after(self, table, key, after=None, columns="*", filters=None, limit=1000, desc=False) -> list:
+        cols = _sql_cols(columns)
+        where, params = _where(list(filters or []) + _keyset_filter(key, after, desc))
+        direction = "DESC" if desc else "ASC"
+        sql = (f"SELECT {cols} FROM {_qi(table)}{where} "
+               f"ORDER BY {', '.join(f'{_qi(k)} {direction}' for k in key)} LIMIT {int(limit)}")
+        return [dict(r) for r in self._conn().execute(sql, params).fetchall()]
+
+    def count(self, table, filters=None) -> int:
+        where, params = _where(filters)
+        return int(self._conn().execute(f"SELECT COUNT(*) FROM {_qi(table)}{where}", params).fetchone()[0])
+
+    def insert(self, table, rows) -> list:
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+        with self.transaction() as conn:
+            return self._insert_rows(conn, table, rows)
+
+    @staticmethod
+    def _insert_rows(conn, table, rows) -> list:
+        # Tabel IDEMPOTENT_INSERTS: baris ber-kunci yang sudah ada dilewati (jurnal write-behind dikirim ulang)
+        conflict = IDEMPOTENT_INSERTS.get(table)
+        clause = f" ON CONFLICT ({_qi(conflict)}) DO NOTHING" if conflict else ""
+        out = []
+        for row in rows:
+            cols = list(row.keys())
+            sql = (f"INSERT INTO {_qi(table)} ({','.join(_qi(c) for c in cols)}) "
+                   f"VALUES ({','.join('?' * len(cols))}){clause} RETURNING *")
+            r = conn.execute(sql, [row[c] for c in cols]).fetchone()
+            if r is not None:
+                out.append(dict(r))
+        return out
+
+    def update(self, table, values: dict, filters) -> None:
+        cols = list(values.keys())
+        where, params = _where(filters)
+        sql = f"UPDATE {_qi(table)} SET {','.join(_qi(c) + ' = ?' for c in cols)}{where}"
+        self._conn().execute(sql, [values[c] for c in cols] + params)
+
+    def delete(self, table, filters) -> None:
+        where, params = _where(filters)
+        self._conn().execute(f"DELETE FROM {_qi(table)}{where}", params)
+
+    def apply_approval_batch(self, ops) -> dict:
+        applied, failed, monthly = [], [], {}
+        with self.transaction() as conn:
+            codes = sorted({op["code"] for op in ops})
+            rows = conn.execute(
+                f"SELECT code, qty, reserved FROM {_qi(INVENTORY_TABLE)} WHERE code IN ({','.join('?' * len(codes))})",
+                codes,
+            ).fetchall()
+            start = {r["code"]: (int(r["qty"] or 0), int(r["reserved"] or 0)) for r in rows}
+            running = {c: q for c, (q, _) in start.items()}
+            reserved = {c: r for c, (_, r) in start.items()}
+            for i, op in enumerate(ops):
+                code = op["code"]
+                if code not in running:
+                    failed.append({"index": i, "reason": "Kode tidak ada di inventory"})
+                    continue
+                if running[code] + int(op["delta"]) < 0:
+                    failed.append({"index": i, "reason": f"Stok tidak cukup (sisa {running[code]})"})
+                    continue
+                if op.get("pending_id") is not None:
+                    cur = conn.execute(f"DELETE FROM {_qi(PENDING_TABLE)} WHERE id = ?", (op["pending_id"],))
+                    if cur.rowcount == 0:
+                        failed.append({"index": i, "reason": "Request sudah diproses"})
+                        continue
+                running[code] += int(op["delta"])
+                reserved[code] = max(reserved[code] - int(op.get("release") or 0), 0)
+                hist = {**op["history"], "stock": running[code]}
+                cols = list(hist.keys())
+                conn.execute(f"INSERT INTO {_qi(HISTORY_TABLE)} ({','.join(_qi(c) for c in cols)}) "
+                             f"VALUES ({','.join('?' * len(cols))})", [hist[c] for c in cols])
+                applied.append({"index": i, "stock": running[code]})
+                if op.get("agg"):
+                    k = tuple(op["agg"][c] for c in MONTHLY_KEY)
+                    monthly[k] = monthly.get(k, 0) + int(op["agg"]["qty"])
+            # Satu UPDATE per kode (delta sudah diakumulasi)
+            conn.executemany(
+                f"UPDATE {_qi(INVENTORY_TABLE)} SET qty = ?, balance = ?, reserved = ? WHERE code = ?",
+                [(q, q, reserved[c], c) for c, q in running.items() if (q, reserved[c]) != start[c]],
+            )
+            self._upsert_monthly(conn, monthly)
+        return {"applied": applied, "failed": failed}
+
+    def submit_pending(self, rows) -> list:
+        rows = list(rows)
+        need = reservation_need(rows)
+        batch_id = rows[0].get("batch_id") if rows else None
+        with self.transaction() as conn:
+            if batch_id:
+                # batch yang sama dikirim ulang -> baris yang sudah tersimpan, tanpa cadangan dobel
+                done = [dict(r) for r in conn.execute(f"SELECT * FROM {_qi(PENDING_TABLE)} WHERE batch_id = ?", (batch_id,))]
+                if done:
+                    return done
+            if need:
+                codes = list(need)
+                avail = {r["code"]: int(r["qty"] or 0) - int(r["reserved"] or 0) for r in conn.execute(
+                    f"SELECT code, qty, reserved FROM {_qi(INVENTORY_TABLE)} WHERE code IN ({','.join('?' * len(codes))})",
+                    codes)}
+                short = {c: max(avail.get(c, 0), 0) for c, q in need.items() if q > avail.get(c, 0)}
+                if short:
+                    raise InsufficientStock(short)
+                conn.executemany(f"UPDATE {_qi(INVENTORY_TABLE)} SET reserved = reserved + ? WHERE code = ?",
+                                 [(q, c) for c, q in need.items()])
+            return self._insert_rows(conn, PENDING_TABLE, rows)
+
+    def reject_pending(self, ids) -> list:
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        with self.transaction() as conn:
+            deleted = [dict(r) for r in conn.execute(
+                f"DELETE FROM {_qi(PENDING_TABLE)} WHERE id IN ({','.join('?' * len(ids))}) RETURNING *", ids)]
+            conn.executemany(f"UPDATE {_qi(INVENTORY_TABLE)} SET reserved = MAX(reserved - ?, 0) WHERE code = ?",
+                             [(q, c) for c, q in reservation_need(deleted).items()])
+        return deleted
+
+    def rebuild_reservations(self) -> None:
+        with self.transaction() as conn:
+            conn.execute(SQLITE_RESERVATION_REBUILD)
+
+    @staticmethod
+    def _upsert_monthly(conn, monthly):
+        cols = ",".join(_qi(c) for c in MONTHLY_KEY)
+        conn.executemany(
+            f"INSERT INTO {_qi(MONTHLY_TABLE)} ({cols}, qty) VALUES ({','.join('?' * (len(MONTHLY_KEY) + 1))}) "
+            f"ON CONFLICT ({cols}) DO UPDATE SET qty = qty + excluded.qty",
+            [k + (q,) for k, q in monthly.items()],
+        )
+
+    def rebuild_monthly(self, brand=None) -> None:
+        with self.transaction() as conn:
+            if brand is None:
+                conn.execute(f"DELETE FROM {_qi(MONTHLY_TABLE)}")
+                conn.execute(SQLITE_MONTHLY_REBUILD.format(brand_clause=""))
+            else:
+                conn.execute(f"DELETE FROM {_qi(MONTHLY_TABLE)} WHERE brand = ?", (brand,))
+                conn.execute(SQLITE_MONTHLY_REBUILD.format(brand_clause="AND brand = ?"), (brand,))
+
+    def seed_from_json(self, path):
+        # Format lama gulavit_data.json / takokak_data.json
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        users = [{"username": u, "password": v.get("password"), "role": v.get("role")}
+                 for u, v in (data.get("users") or {}).items()]
+        inventory = [{"code": code, "item": v.get("name"), "qty": int(v.get("qty", 0)), "balance": int(v.get("qty", 0)),
+                      "unit": v.get("unit", "-"), "category": v.get("category", "Uncategorized")}
+                     for code, v in (data.get("inventory") or {}).items()]
+        self.insert(USERS_TABLE, users)
+        self.insert(INVENTORY_TABLE, inventory)
+        self.insert(HISTORY_TABLE, data.get("history") or [])
+
+
+# ================== PEMILIHAN BACKEND ==================
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def backend_from_config(get) -> StorageBackend:
+    # get(key, default) -> nilai konfigurasi (st.secrets / env)
+    kind = str(get("STORAGE_BACKEND", "supabase")).strip().lower()
+    if kind == "sqlite":
+        return open_backend("sqlite", path=get("SQLITE_PATH", "inventory.db"), seed_json=get("SQLITE_SEED_JSON"))
+    return open_backend("supabase", url=get("SUPABASE_URL"), key=get("SUPABASE_KEY"),
+                        timeout=get("SUPABASE_TIMEOUT"), retries=get("SUPABASE_RETRIES"))
+
+
+def open_backend(kind="supabase", **opts) -> StorageBackend:
+    # Satu instance per konfigurasi per proses (modul ini tidak di-exec ulang saat rerun Streamlit)
+    kind = (kind or "supabase").strip().lower()
+    key = (kind, tuple(sorted(opts.items())))
+    with _BACKENDS_LOCK:
+        if key not in _BACKENDS:
+            if kind == "supabase":
+                _BACKENDS[key] = SupabaseBackend(opts["url"], opts["key"], timeout=opts.get("timeout"),
+                                                 retries=opts.get("retries"))
+            elif kind == "sqlite":
+                _BACKENDS[key] = SQLiteBackend(opts.get("path") or "inventory.db", seed_json=opts.get("seed_json"))
+            else:
+                raise ValueError(f"STORAGE_BACKEND tidak dikenal: {kind}")
+        return _BACKENDS[key]
+
+
+# ================== CLI ==================
+# python storage.py rebuild-monthly [--brand gulavit]
+# python storage.py rebuild-reservations
+# Konfigurasi dibaca dari .streamlit/secrets.toml lalu environment (sama dengan app._config).
+def _cli_config():
+    secrets = {}
+    path = os.path.join(".streamlit", "secrets.toml")
+    if os.path.exists(path):
+        import tomllib
+        with open(path, "rb") as f:
+            secrets = tomllib.load(f)
+    # Urutan sama dengan app._config: secrets.toml dulu, lalu environment variable
+    return lambda key, default=None: secrets[key] if key in secrets else os.environ.get(key, default)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Perawatan storage inventory")
+    parser.add_argument("command", choices=["rebuild-monthly", "rebuild-reservations"])
+    parser.add_argument("--brand", default=None)
+    args = parser.parse_args()
+    backend = backend_from_config(_cli_config())
+    if args.command == "rebuild-monthly":
+        backend.rebuild_monthly(brand=args.brand)
+        print(f"{MONTHLY_TABLE} dibangun ulang ({backend.name}).")
+    elif args.command == "rebuild-reservations":
+        backend.rebuild_reservations()
+        print(f"Reservasi stok dihitung ulang dari {PENDING_TABLE} ({backend.name}).")
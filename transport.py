@@ -0,0 +1,141 @@
+# transport.py
+# Transport HTTP untuk client Supabase (PostgREST): satu pool koneksi per proses, timeout per jenis
+# panggilan, retry dengan exponential backoff + jitter, dan histogram latensi/error per tabel.
+# Aturan retry:
+#   - gagal sebelum request terkirim (connect / pool penuh) -> selalu aman diulang
+#   - gagal setelah terkirim (timeout baca, 5xx, 429) -> hanya GET/HEAD atau request ber-header Idempotency-Key
+#     (insert riwayat ber-request_key, submit_pending_batch ber-batch_id, update/delete nilai absolut)
+import bisect
+import random
+import threading
+import time
+import httpx
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+RETRY_STATUS = (408, 429, 500, 502, 503, 504, 520)
+# Timeout (detik) per jenis panggilan; connect dibatasi terpisah supaya host mati cepat ketahuan
+TIMEOUTS = {"read": 15.0, "write": 20.0, "rpc": 30.0}
+CONNECT_TIMEOUT = 5.0
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryPolicy:
+    def __init__(self, retries=3, base_delay=0.2, max_delay=5.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None) -> float:
+        # Full jitter: acak 0..min(max, base * 2^attempt); Retry-After server dipakai jika lebih lama
+        d = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        try:
+            return min(self.max_delay, max(d, float(retry_after)))
+        except (TypeError, ValueError):
+            return d
+
+
+def table_of(path) -> str:
+    # /rest/v1/<tabel> atau /rest/v1/rpc/<fungsi> -> "<tabel>" / "rpc/<fungsi>"
+    parts = [p for p in path.split("/") if p]
+    if "v1" in parts:
+        parts = parts[parts.index("v1") + 1:]
+    return "/".join(parts[:2]) if parts[:1] == ["rpc"] else (parts[0] if parts else "-")
+
+
+class HttpStats:
+    # Per tabel: jumlah panggilan, retry, error per jenis, histogram latensi (ms) per percobaan
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._tables = {}
+
+    def _entry(self, table):
+        return self._tables.setdefault(table, {"calls": 0, "retries": 0, "errors": {},
+                                               "hist": [0] * (len(self.buckets) + 1)})
+
+    def record(self, table, elapsed, error=None, retry=False):
+        ms = elapsed * 1000
+        with self._lock:
+            e = self._entry(table)
+            e["calls"] += 1
+            e["hist"][bisect.bisect_left(self.buckets, ms)] += 1
+            if retry:
+                e["retries"] += 1
+            if error:
+                e["errors"][error] = e["errors"].get(error, 0) + 1
+
+    def _quantile(self, hist, q):
+        # Batas atas bucket tempat kuantil jatuh (perkiraan dari histogram)
+        total, acc = sum(hist), 0
+        for i, n in enumerate(hist):
+            acc += n
+            if total and acc >= q * total:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return 0
+
+    def report(self) -> list:
+        with self._lock:
+            tables = {t: {**e, "errors": dict(e["errors"]), "hist": list(e["hist"])} for t, e in self._tables.items()}
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return [{"Tabel": t, "Panggilan": e["calls"], "Retry": e["retries"],
+                 "Error": ", ".join(f"{k}×{n}" for k, n in sorted(e["errors"].items())) or "-",
+                 "p50 (ms)": self._quantile(e["hist"], 0.5), "p95 (ms)": self._quantile(e["hist"], 0.95),
+                 "Histogram (ms)": " ".join(f"{lb}:{n}" for lb, n in zip(labels, e["hist"]) if n)}
+                for t, e in sorted(tables.items())]
+
+
+class ResilientTransport(httpx.BaseTransport):
+    def __init__(self, inner=None, policy=None, stats=None, timeouts=None, sleep=time.sleep):
+        self.inner = inner or httpx.HTTPTransport(limits=POOL_LIMITS)
+        self.policy = policy or RetryPolicy()
+        self.stats = stats or HttpStats()
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self.sleep = sleep
+
+    def _timeout(self, request, table):
+        kind = "rpc" if table.startswith("rpc/") else "read" if request.method in ("GET", "HEAD") else "write"
+        return httpx.Timeout(self.timeouts[kind], connect=min(CONNECT_TIMEOUT, self.timeouts[kind])).as_dict()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        table = table_of(request.url.path)
+        idempotent = request.method in ("GET", "HEAD") or IDEMPOTENCY_HEADER in request.headers
+        request.extensions = {**request.extensions, "timeout": self._timeout(request, table)}
+        request.read()   # body di-buffer supaya bisa dikirim ulang
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                resp = self.inner.handle_request(request)
+                resp.read()
+            except httpx.TransportError as e:
+                retry = attempt < self.policy.retries and (isinstance(e, _NOT_SENT) or idempotent)
+                self.stats.record(table, time.perf_counter() - start, error=type(e).__name__, retry=retry)
+                if not retry:
+                    raise
+                self.sleep(self.policy.delay(attempt))
+                attempt += 1
+                continue
+            elapsed = time.perf_counter() - start
+            if resp.status_code in RETRY_STATUS and idempotent and attempt < self.policy.retries:
+                self.stats.record(table, elapsed, error=str(resp.status_code), retry=True)
+                resp.close()
+                self.sleep(self.policy.delay(attempt, resp.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            self.stats.record(table, elapsed, error=str(resp.status_code) if resp.status_code >= 400 else None)
+            return resp
+
+    def close(self):
+        self.inner.close()
+
+
+def resilient_http_client(policy=None, timeouts=None, inner=None) -> httpx.Client:
+    # httpx.Client untuk supabase ClientOptions(httpx_client=...); statistik di client.transport_stats
+    transport = ResilientTransport(inner=inner, policy=policy, timeouts=timeouts)
+    client = httpx.Client(transport=transport, timeout=httpx.Timeout(TIMEOUTS["read"], connect=CONNECT_TIMEOUT),
+                          follow_redirects=True, http2=False)
+    client.transport_stats = transport.stats
+    return client